@@ -141,7 +141,7 @@ const Dashboard = () => {
         const [imagesRes, actionsRes] = await Promise.all([
           axiosInstance.get(`images/?user=${userData.username}`).catch(err => {
             console.error('Error fetching images:', err);
-            return { data: { results: [], count: 0 } };
+            return { data: { results: [] } };
           }),
           axiosInstance.get('actions/').catch(err => {
             console.error('Error fetching activities:', err);
@@ -151,7 +151,8 @@ const Dashboard = () => {
 
         // Process images
         const results = imagesRes.data.results || imagesRes.data || [];
-        const totalCount = imagesRes.data.count || results.length;
+        // Cursor pages carry no count; the profile keeps the denormalized total
+        const totalCount = profileData.posts_count ?? results.length;
         
         const transformedImages = results.map(img => ({
           uuid: img.uuid,
@@ -173,7 +174,8 @@ const Dashboard = () => {
             username: action.user?.username,
             firstName: action.user?.first_name || action.user?.username,
             photo: action.user?.profile?.photo
-          }
+          },
+          target: action.target
         }));
         setActivities(transformedActivities);
 
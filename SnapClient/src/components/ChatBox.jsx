@@ -18,7 +18,7 @@ import {
 
 const ChatBox = ({ otherUser, currentUserId, currentUserUsername, onBack, autoAnswerSignal }) => {
     const navigate = useNavigate();
-    const { messages, loading, sendMessage, sendReaction, socket } = useChat(otherUser?.id, currentUserId);
+    const { messages, hasOlder, loadOlder, loading, sendMessage, sendReaction, socket } = useChat(otherUser?.id, currentUserId);
     const [messageInput, setMessageInput] = useState('');
     const [showEmojiPicker, setShowEmojiPicker] = useState(false);
     const [activeReactionMessageId, setActiveReactionMessageId] = useState(null);
@@ -181,6 +181,17 @@ const ChatBox = ({ otherUser, currentUserId, currentUserUsername, onBack, autoAn
                     </div>
                 )}
                 
+                {hasOlder && (
+                    <div className="flex justify-center pb-2">
+                        <button
+                            onClick={loadOlder}
+                            className="text-[10px] font-black uppercase tracking-widest opacity-60 hover:opacity-100"
+                        >
+                            Load earlier messages
+                        </button>
+                    </div>
+                )}
+
                 {messages.map((msg, i) => {
                     const isMe = Number(msg.sender_id) === Number(currentUserId);
                     const prevMsg = messages[i - 1];
@@ -190,7 +201,7 @@ const ChatBox = ({ otherUser, currentUserId, currentUserUsername, onBack, autoAn
                     const isMenuOpen = activeReactionMessageId === msg.id;
 
                     return (
-                        <div key={i} className={`flex flex-col ${isMe ? 'items-end' : 'items-start'} mb-1`}>
+                        <div key={msg.id ?? i} className={`flex flex-col ${isMe ? 'items-end' : 'items-start'} mb-1`}>
                             {isFirstInGroup && (
                                 <span className={`text-[10px] font-black uppercase tracking-widest mb-1 opacity-40 ${isMe ? 'mr-3' : 'ml-3'}`}>
                                     {isMe ? 'You' : (msg.sender_username || otherUser.username)}
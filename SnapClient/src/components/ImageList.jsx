@@ -2,14 +2,14 @@ import React, { useState, useEffect, useRef, useCallback } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { FontAwesomeIcon } from '@fortawesome/react-fontawesome';
 import { faHeart, faEye } from '@fortawesome/free-solid-svg-icons';
-import axiosInstance, { API_BASE_URL, getFullMediaUrl } from '../utils/axiosInstance';
+import axiosInstance, { API_BASE_URL, getFullMediaUrl, buildSrcSet } from '../utils/axiosInstance';
 import Navbar from './Navbar';
 import ImageModal from './ImageModal';
 
 const ImageList = () => {
   const [images, setImages] = useState([]);
   const [loading, setLoading] = useState(true);
-  const [page, setPage] = useState(1);
+  const [nextUrl, setNextUrl] = useState(null);
   const [hasMore, setHasMore] = useState(true);
   const [selectedImageUuid, setSelectedImageUuid] = useState(null);
   const [isModalOpen, setIsModalOpen] = useState(false);
@@ -19,21 +19,21 @@ const ImageList = () => {
   const lastImageRef = useRef(null);
   const observerRef = useRef(null);
 
-  const fetchImages = useCallback(async (pageNum = 1) => {
+  const fetchImages = useCallback(async (url = null) => {
     try {
       setLoading(true);
-      const response = await axiosInstance.get('images/', {
-        params: { page: pageNum }
-      });
+      // The API pages with an opaque cursor; follow its `next` link for more
+      const response = await axiosInstance.get(url || 'images/');
       const newImages = response.data.results || response.data || [];
       
-      if (pageNum === 1) {
+      if (!url) {
         setImages(newImages);
       } else {
         setImages(prev => [...prev, ...newImages]);
       }
       
       // Check if there's a next page in the pagination response
+      setNextUrl(response.data.next || null);
       setHasMore(!!response.data.next);
     } catch (error) {
       console.error('Error fetching images:', error);
@@ -61,9 +61,7 @@ const ImageList = () => {
     observerRef.current = new IntersectionObserver(
       (entries) => {
         if (entries[0].isIntersecting && hasMore && !loading) {
-          const nextPage = page + 1;
-          setPage(nextPage);
-          fetchImages(nextPage);
+          fetchImages(nextUrl);
         }
       },
       { threshold: 0.1 }
@@ -80,7 +78,7 @@ const ImageList = () => {
         observerRef.current.disconnect();
       }
     };
-  }, [loading, hasMore, page, fetchImages]); // Dependencies for the observer
+  }, [loading, hasMore, nextUrl, fetchImages]); // Dependencies for the observer
 
   if (loading && images.length === 0) {
     return (
@@ -122,12 +120,26 @@ const ImageList = () => {
                 }}
                 className="aspect-square relative cursor-pointer group overflow-hidden bg-gray-200"
               >
-                <img
-                  src={getFullMediaUrl(image.image || image.url)}
-                  alt={image.title}
-                  loading="lazy"
-                  className="w-full h-full object-cover"
-                />                <div className="absolute inset-0 bg-black/40 opacity-0 group-hover:opacity-100 transition-opacity duration-200 flex items-center justify-center gap-6">
+                <picture>
+                  {/* The browser picks the smallest format it supports */}
+                  {['avif', 'webp'].filter(format => image.sources?.[format]).map(format => (
+                    <source
+                      key={format}
+                      type={`image/${format}`}
+                      srcSet={buildSrcSet(image.sources[format])}
+                      sizes="(min-width: 768px) 33vw, 50vw"
+                    />
+                  ))}
+                  <img
+                    src={getFullMediaUrl(image.image || image.url)}
+                    srcSet={buildSrcSet(image.srcset) || undefined}
+                    sizes="(min-width: 768px) 33vw, 50vw"
+                    alt={image.title}
+                    loading="lazy"
+                    className="w-full h-full object-cover"
+                    style={image.placeholder ? { backgroundImage: `url(${image.placeholder})`, backgroundSize: 'cover' } : undefined}
+                  />
+                </picture>                <div className="absolute inset-0 bg-black/40 opacity-0 group-hover:opacity-100 transition-opacity duration-200 flex items-center justify-center gap-6">
                   <div className="flex items-center gap-2 text-white font-bold text-lg">
                     <FontAwesomeIcon icon={faHeart} />
                     <span>{image.total_likes || 0}</span>
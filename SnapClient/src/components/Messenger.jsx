@@ -16,13 +16,29 @@ const Messenger = () => {
     const [loading, setLoading] = useState(true);
     const [currentUserId, setCurrentUserId] = useState(null);
     const [currentUserUsername, setCurrentUserUsername] = useState('');
+    const [online, setOnline] = useState({});
+    const [contactsNext, setContactsNext] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     useEffect(() => {
         const fetchUsers = async () => {
             try {
-                // Using 'users/' as confirmed working in UserList.jsx
-                const response = await axiosInstance.get('users/');
-                const data = response.data.results || response.data || [];
+                // Existing chats first (latest message, unread count), then the
+                // most relevant contacts to start a new one with
+                const [inboxResponse, discoverResponse] = await Promise.all([
+                    axiosInstance.get('inbox/'),
+                    axiosInstance.get('users/discover/'),
+                ]);
+                const conversations = (inboxResponse.data.results || []).map(c => ({
+                    ...c.user,
+                    last_message: c.last_message,
+                    unread_count: c.unread_count,
+                }));
+                const chattedIds = new Set(conversations.map(u => u.id));
+                const contacts = (discoverResponse.data.results || discoverResponse.data || [])
+                    .filter(u => !chattedIds.has(u.id));
+                const data = [...conversations, ...contacts];
+                setContactsNext(discoverResponse.data.next || null);
                 
                 const token = localStorage.getItem('access');
                 if (token) {
@@ -53,12 +69,57 @@ const Messenger = () => {
         fetchUsers();
     }, [location.state]);
 
+    // Online state for the whole list in one call, then live updates from the notification socket
+    const presenceIds = users.slice(0, 200).map(u => u.id).join(',');
+    useEffect(() => {
+        if (!presenceIds) return;
+        axiosInstance.get('presence/', { params: { ids: presenceIds } })
+            .then(response => setOnline(Object.fromEntries(
+                Object.entries(response.data).map(([id, state]) => [id, state.online])
+            )))
+            .catch(err => console.error("Fetch presence error:", err));
+    }, [presenceIds]);
+
+    useEffect(() => {
+        const handlePresence = (event) => {
+            const { user_id, status } = event.detail;
+            setOnline(prev => ({ ...prev, [user_id]: status === 'online' }));
+        };
+        window.addEventListener('snapnest:presence', handlePresence);
+        return () => window.removeEventListener('snapnest:presence', handlePresence);
+    }, []);
+
+    // Further discover pages, skipping anyone already listed (chats, self)
+    const loadMoreContacts = async () => {
+        if (!contactsNext || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const response = await axiosInstance.get(contactsNext);
+            const more = response.data.results || [];
+            setUsers(prev => {
+                const listed = new Set(prev.map(u => u.id));
+                return [...prev, ...more.filter(u => !listed.has(u.id) && u.id !== currentUserId)];
+            });
+            setContactsNext(response.data.next || null);
+        } catch (err) {
+            console.error("Fetch more contacts error:", err);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const filteredUsers = users.filter(u => 
         u.username.toLowerCase().includes(search.toLowerCase())
     );
 
     const handleBack = () => setSelectedUser(null);
 
+    const selectUser = (user) => {
+        setSelectedUser(user);
+        // Opening the chat reads it
+        setUsers(prev => prev.map(u => u.id === user.id ? { ...u, unread_count: 0 } : u));
+    };
+
     const getOtherUserPhoto = (user) => {
         return user.profile?.photo ? getFullMediaUrl(user.profile.photo) : null;
     };
@@ -101,7 +162,7 @@ const Messenger = () => {
                         {filteredUsers.map(user => (
                             <div 
                                 key={user.id}
-                                onClick={() => setSelectedUser(user)}
+                                onClick={() => selectUser(user)}
                                 className={`
                                     flex items-center gap-4 px-6 py-4 cursor-pointer transition-all duration-200 border-b-2 border-gray-100
                                     ${selectedUser?.id === user.id 
@@ -118,12 +179,25 @@ const Messenger = () => {
                                         }} 
                                         className="w-14 h-14"
                                     />
+                                    {online[user.id] && (
+                                        <span className="absolute bottom-0 right-0 w-4 h-4 rounded-full bg-green-500 border-2 border-white" title="Online" />
+                                    )}
                                 </div>
                                 <div className="flex-1 min-w-0">
                                     <p className={`text-[15px] font-black truncate ${selectedUser?.id === user.id ? 'text-black' : 'text-gray-900'}`}>
                                         {user.username}
                                     </p>
+                                    {user.last_message && (
+                                        <p className={`text-xs truncate ${user.unread_count ? 'font-black text-black' : 'text-gray-500'}`}>
+                                            {user.last_message.content}
+                                        </p>
+                                    )}
                                 </div>
+                                {user.unread_count > 0 && (
+                                    <span className="min-w-[24px] h-6 px-2 flex items-center justify-center rounded-full bg-black text-yellow-400 text-xs font-black">
+                                        {user.unread_count}
+                                    </span>
+                                )}
                             </div>
                         ))}
                         {filteredUsers.length === 0 && (
@@ -131,6 +205,17 @@ const Messenger = () => {
                                 <p className="text-gray-400 text-sm italic font-medium">No conversations found</p>
                             </div>
                         )}
+                        {contactsNext && (
+                            <div className="text-center py-4">
+                                <button
+                                    onClick={loadMoreContacts}
+                                    disabled={loadingMore}
+                                    className="text-[10px] font-black uppercase tracking-widest opacity-60 hover:opacity-100 disabled:opacity-30"
+                                >
+                                    {loadingMore ? 'Loading...' : 'Load more people'}
+                                </button>
+                            </div>
+                        )}
                     </div>
                 </div>
 
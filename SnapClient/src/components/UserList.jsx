@@ -11,6 +11,8 @@ const UserList = () => {
   const [users, setUsers] = useState([]);
   const [loading, setLoading] = useState(true);
   const [followingStatus, setFollowingStatus] = useState({});
+  const [nextUrl, setNextUrl] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const [currentUsername, setCurrentUsername] = useState(null);
 
@@ -28,18 +30,20 @@ const UserList = () => {
     }
   };
 
-  const fetchUsers = async () => {
+  // Discover is cursor-paginated; later pages are appended by "Load more"
+  const fetchUsers = async (url = 'users/discover/') => {
     try {
-      const response = await axiosInstance.get('users/');
+      const response = await axiosInstance.get(url);
       const usersData = response.data.results || response.data || [];
-      setUsers(usersData);
+      setUsers(prev => (url === 'users/discover/' ? usersData : [...prev, ...usersData]));
+      setNextUrl(response.data.next || null);
       
       // Initialize following status from API response
       const status = {};
       usersData.forEach(user => {
         status[user.id] = user.is_following || false;
       });
-      setFollowingStatus(status);
+      setFollowingStatus(prev => ({ ...prev, ...status }));
     } catch (error) {
       console.error('Error fetching users:', error);
       if (error.response?.status === 401) {
@@ -50,6 +54,13 @@ const UserList = () => {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextUrl || loadingMore) return;
+    setLoadingMore(true);
+    await fetchUsers(nextUrl);
+    setLoadingMore(false);
+  };
+
   const handleFollow = async (userId, currentStatus) => {
     // Find the user to get the username
     const user = users.find(u => u.id === userId);
@@ -186,6 +197,18 @@ const UserList = () => {
               <p className="text-gray-600">Be the first to join!</p>
             </div>
           )}
+
+          {nextUrl && (
+            <div className="text-center mt-8">
+              <button
+                onClick={loadMore}
+                disabled={loadingMore}
+                className="px-6 py-2 rounded-lg font-bold border-2 border-black bg-black text-yellow-400 hover:bg-gray-800 disabled:opacity-50"
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
         </div>
       </div>
     </>
@@ -7,6 +7,8 @@ import axiosInstance from '../utils/axiosInstance';
 
 const NotificationContext = createContext();
 
+const HEARTBEAT_INTERVAL = 25000;
+
 export const useNotification = () => useContext(NotificationContext);
 
 export const NotificationProvider = ({ children }) => {
@@ -27,6 +29,7 @@ export const NotificationProvider = ({ children }) => {
 
         let ws;
         let reconnectTimer;
+        let heartbeatTimer;
 
         const connect = () => {
             console.log('Connecting to Notification WS:', wsUrl);
@@ -34,6 +37,12 @@ export const NotificationProvider = ({ children }) => {
 
             ws.onopen = () => {
                 console.log('✅ Notification WebSocket Connected');
+                // Keeps the user online in the presence service (expires after 60s without one)
+                heartbeatTimer = setInterval(() => {
+                    if (ws.readyState === WebSocket.OPEN) {
+                        ws.send(JSON.stringify({ type: 'heartbeat' }));
+                    }
+                }, HEARTBEAT_INTERVAL);
             };
 
             ws.onmessage = async (event) => {
@@ -50,6 +59,12 @@ export const NotificationProvider = ({ children }) => {
                         });
                         
                         setIncomingCall(data);
+                    } else if (data.type === 'presence') {
+                        // Followed users and chat partners coming online or going offline
+                        window.dispatchEvent(new CustomEvent('snapnest:presence', { detail: data }));
+                    } else if (data.type === 'image_processed') {
+                        // URL bookmarks finish on the server's job worker; let open pages refresh
+                        window.dispatchEvent(new CustomEvent('snapnest:image_processed', { detail: data }));
                     }
                 } catch (err) {
                     console.error("Notification Parse Error:", err);
@@ -58,6 +73,7 @@ export const NotificationProvider = ({ children }) => {
 
             ws.onclose = (e) => {
                  console.log('❌ Notification WebSocket Disconnected', e.code, e.reason);
+                 clearInterval(heartbeatTimer);
                  // Try to reconnect in 3 seconds
                  reconnectTimer = setTimeout(connect, 3000);
             };
@@ -70,6 +86,7 @@ export const NotificationProvider = ({ children }) => {
         return () => {
             if (ws) ws.close();
             if (reconnectTimer) clearTimeout(reconnectTimer);
+            clearInterval(heartbeatTimer);
         };
     }, []);
 
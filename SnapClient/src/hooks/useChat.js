@@ -6,9 +6,26 @@ const useChat = (recipientId) => {
     const [isConnected, setIsConnected] = useState(false);
     const [isRecipientOnline, setIsRecipientOnline] = useState(false);
     const [isTyping, setIsTyping] = useState(false);
+    const [olderUrl, setOlderUrl] = useState(null);
     const socketRef = useRef(null);
     const typingTimeoutRef = useRef(null);
 
+    // History pages come newest first; each page is reversed and put in front.
+    // Message ids are strings: they are larger than JavaScript can hold exactly.
+    const toChatMessages = (page) => [...page].reverse().map(m => ({
+        ...m,
+        id: String(m.id),
+        message: m.content || m.message, 
+        sender_id: m.sender,
+        timestamp: m.timestamp,
+        reactions: []
+    }));
+
+    // Clears this chat's unread count in the inbox
+    const markRead = () => {
+        axiosInstance.post(`messages/${recipientId}/read/`).catch(() => {});
+    };
+
     // Fetch message history
     useEffect(() => {
         if (!recipientId) return;
@@ -16,15 +33,9 @@ const useChat = (recipientId) => {
         const fetchHistory = async () => {
             try {
                 const response = await axiosInstance.get(`messages/${recipientId}/`);
-                const history = response.data.results || response.data || [];
-                setMessages(history.map(m => ({
-                    ...m,
-                    id: m.id,
-                    message: m.content || m.message, 
-                    sender_id: m.sender,
-                    timestamp: m.timestamp,
-                    reactions: []
-                })));
+                setMessages(toChatMessages(response.data.results || []));
+                setOlderUrl(response.data.next);
+                markRead();
             } catch (err) {
                 console.error("Fetch message history error:", err);
             }
@@ -33,6 +44,17 @@ const useChat = (recipientId) => {
         fetchHistory();
     }, [recipientId]);
 
+    const loadOlder = async () => {
+        if (!olderUrl) return;
+        try {
+            const response = await axiosInstance.get(olderUrl);
+            setMessages((prev) => [...toChatMessages(response.data.results || []), ...prev]);
+            setOlderUrl(response.data.next);
+        } catch (err) {
+            console.error("Fetch older messages error:", err);
+        }
+    };
+
     useEffect(() => {
         if (!recipientId) return;
         
@@ -54,9 +76,12 @@ const useChat = (recipientId) => {
                     const data = JSON.parse(event.data);
                     
                     if (data.type === 'chat_message') {
+                        if (Number(data.sender_id) === Number(recipientId)) {
+                            markRead();
+                        }
                         setMessages((prev) => [...prev, {
                             ...data,
-                            id: data.id,
+                            id: String(data.id),
                             message: data.message || data.content,
                             sender_id: data.sender_id,
                             sender_username: data.sender_username,
@@ -64,7 +89,7 @@ const useChat = (recipientId) => {
                         }]);
                     } else if (data.type === 'chat_reaction') {
                         setMessages((prev) => prev.map(msg => {
-                            if (msg.id === data.message_id) {
+                            if (msg.id === String(data.message_id)) {
                                 const currentReactions = msg.reactions || [];
                                 const otherReactions = currentReactions.filter(r => Number(r.sender_id) !== Number(data.sender_id));
                                 
@@ -138,6 +163,8 @@ const useChat = (recipientId) => {
 
     return { 
         messages, 
+        hasOlder: Boolean(olderUrl),
+        loadOlder,
         sendMessage, 
         sendReaction, 
         sendTypingStatus,
@@ -25,6 +25,12 @@ export const getFullMediaUrl = (path) => {
   return `${API_BASE_URL}${absolutePath}`;
 };
 
+// Turn the API's {width: url} rendition map into an <img srcSet> string
+export const buildSrcSet = (srcset) =>
+  Object.entries(srcset || {})
+    .map(([width, url]) => `${getFullMediaUrl(url)} ${width}w`)
+    .join(', ');
+
 const axiosInstance = axios.create({
   baseURL: VITE_API_URL,
   headers: {
@@ -0,0 +1,134 @@
+import json
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = 'jobs:queue'
+# Jobs a worker has taken but not finished; put back on the queue when a worker starts
+PROCESSING_KEY = 'jobs:processing'
+# Failed jobs waiting for their retry, scored by when they may run again
+DELAYED_KEY = 'jobs:delayed'
+# Jobs that used up all their attempts, kept for inspection
+DEAD_KEY = 'jobs:dead'
+# Set while a job with this idempotency key is running, then once it has succeeded
+DONE_KEY = 'jobs:done:{key}'
+DONE_TTL = 60 * 60 * 24
+RUNNING_TTL = 60 * 10
+# How long a job found running elsewhere waits before it is tried again
+RUNNING_RETRY_DELAY = 30
+
+
+def enqueue(func, *args, idempotency_key=None, **kwargs):
+    """
+    Run ``func(*args, **kwargs)`` on the job worker once the current transaction commits.
+
+    ``func`` must be a module-level function and its arguments JSON
+    serializable (pass ids, not model instances). A job is retried with
+    exponential backoff when it raises, and runs at most once successfully per
+    ``idempotency_key`` (a random one by default), so redelivered jobs are
+    skipped. With JOBS_EAGER on, the job runs in-process instead.
+    """
+    payload = {
+        'func': f'{func.__module__}.{func.__qualname__}',
+        'args': args,
+        'kwargs': kwargs,
+        'key': idempotency_key or uuid.uuid4().hex,
+        'attempts': 0,
+    }
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: run_job(get_redis_connection(), payload, raise_errors=True))
+    else:
+        message = json.dumps(payload)
+        transaction.on_commit(lambda: get_redis_connection().lpush(QUEUE_KEY, message))
+    return payload['key']
+
+
+def run_job(redis_conn, payload, raise_errors=False):
+    """
+    Run one job, honouring its idempotency key. On failure the job is scheduled
+    for a retry, or moved to the dead list after JOBS_MAX_ATTEMPTS.
+
+    A job whose key is still marked running (on another worker, or left behind
+    by one that died) is put back on the delayed set rather than dropped, and
+    runs once the marker is cleared or expires.
+
+    Returns True when the job ran (or had already run) successfully.
+    """
+    done_key = DONE_KEY.format(key=payload['key'])
+    if not redis_conn.set(done_key, 'running', nx=True, ex=RUNNING_TTL):
+        if redis_conn.get(done_key) == 'done':
+            return True
+        redis_conn.zadd(DELAYED_KEY, {json.dumps(payload): time.time() + RUNNING_RETRY_DELAY})
+        return False
+
+    try:
+        import_string(payload['func'])(*payload['args'], **payload['kwargs'])
+    except Exception:
+        redis_conn.delete(done_key)
+        if raise_errors:
+            raise
+        logger.exception('Job %s failed', payload['func'])
+        retry(redis_conn, payload)
+        return False
+
+    redis_conn.set(done_key, 'done', ex=DONE_TTL)
+    return True
+
+
+def retry(redis_conn, payload):
+    payload = dict(payload, attempts=payload['attempts'] + 1)
+    if payload['attempts'] >= settings.JOBS_MAX_ATTEMPTS:
+        redis_conn.lpush(DEAD_KEY, json.dumps(payload))
+        return
+    delay = settings.JOBS_RETRY_DELAY * 2 ** (payload['attempts'] - 1)
+    redis_conn.zadd(DELAYED_KEY, {json.dumps(payload): time.time() + delay})
+
+
+def promote_delayed(redis_conn):
+    """Move retries whose backoff has elapsed back onto the queue"""
+    due = redis_conn.zrangebyscore(DELAYED_KEY, '-inf', time.time())
+    for message in due:
+        # ZREM decides which worker gets to requeue a job
+        if redis_conn.zrem(DELAYED_KEY, message):
+            redis_conn.lpush(QUEUE_KEY, message)
+    return len(due)
+
+
+def recover(redis_conn):
+    """Requeue jobs left in the processing list by a worker that died"""
+    recovered = 0
+    while redis_conn.lmove(PROCESSING_KEY, QUEUE_KEY, 'RIGHT', 'LEFT'):
+        recovered += 1
+    return recovered
+
+
+def work(redis_conn, block_timeout=5, burst=False):
+    """
+    Process jobs until stopped, or until the queue is empty when ``burst`` is set.
+
+    Each job is moved atomically from the queue to the processing list and only
+    removed once it has run, so a crash loses nothing; the idempotency key
+    keeps the replay from running a finished job twice.
+    """
+    processed = 0
+    while True:
+        promote_delayed(redis_conn)
+        if burst:
+            message = redis_conn.lmove(QUEUE_KEY, PROCESSING_KEY, 'RIGHT', 'LEFT')
+        else:
+            message = redis_conn.blmove(QUEUE_KEY, PROCESSING_KEY, block_timeout, 'RIGHT', 'LEFT')
+        if message is None:
+            if burst:
+                return processed
+            continue
+        run_job(redis_conn, json.loads(message))
+        redis_conn.lrem(PROCESSING_KEY, 1, message)
+        processed += 1
@@ -0,0 +1,181 @@
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from rest_framework.pagination import CursorPagination
+
+
+class CreatedCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created, id), newest first.
+
+    Each page is an index range scan from the cursor position, so deep pages
+    cost the same as the first one and there is no COUNT(*).
+    """
+    ordering = ('-created', '-id')
+
+
+class TimestampCursorPagination(CursorPagination):
+    """Keyset pagination over (timestamp, id) for chat messages, newest first"""
+    ordering = ('-timestamp', '-id')
+
+
+class ActivityCursorPagination(CursorPagination):
+    """Keyset pagination over (last_activity, id) for the chat inbox, most recent first"""
+    ordering = ('-last_activity', '-id')
+
+
+class UserCursorPagination(CursorPagination):
+    """
+    Keyset pagination over the primary key, newest members first. Ids follow
+    join order, and unlike ``date_joined`` they are indexed.
+    """
+    ordering = ('-id',)
+
+
+class RankedPage:
+    """A single page of rows plus the cursor for the page after it"""
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+class RankedKeysetPaginator:
+    """
+    Paginate rows ranked-first by a Redis sorted set without materializing the table.
+
+    Ranked rows come straight from a ZREVRANGE slice of the sorted set, so a
+    page only costs the rows it shows. Once the ranking is exhausted the
+    paginator walks the remaining rows with a keyset over (-keyset_field, -id)
+    and skips anything that is already ranked. With ``keyset_field='id'`` the
+    keyset is the primary key alone.
+
+    Cursors are opaque strings: either ``r:<rank offset>`` while inside the
+    ranking, or ``u:<keyset value>|<id>`` once past it (the value is empty
+    when keyed on the id alone).
+    """
+
+    def __init__(self, redis_conn, per_page, queryset, ranking_key, keyset_field='created'):
+        self.r = redis_conn
+        self.per_page = per_page
+        self.queryset = queryset
+        self.ranking_key = ranking_key
+        self.keyset_field = keyset_field
+
+    def page(self, cursor=None):
+        position = self.decode_cursor(cursor)
+        rows = []
+        next_cursor = None
+
+        if position[0] == 'r':
+            offset = position[1]
+            offset = self._fill_ranked(rows, offset)
+            if len(rows) == self.per_page:
+                next_cursor = self.encode_cursor(('r', offset))
+                return RankedPage(rows, next_cursor)
+            position = ('u', None, None)
+
+        last = self._fill_unranked(rows, position[1], position[2])
+        if last is not None:
+            value = '' if self.keyset_field == 'id' else getattr(last, self.keyset_field).isoformat()
+            next_cursor = self.encode_cursor(('u', value, last.id))
+        return RankedPage(rows, next_cursor)
+
+    def _fill_ranked(self, rows, offset):
+        """Append ranked rows starting at ``offset`` and return the new offset"""
+        total = self.r.zcard(self.ranking_key)
+        while len(rows) < self.per_page and offset < total:
+            wanted = self.per_page - len(rows)
+            ranked_ids = [
+                int(member) for member in
+                self.r.zrange(self.ranking_key, offset, offset + wanted - 1, desc=True)
+            ]
+            if not ranked_ids:
+                break
+            offset += len(ranked_ids)
+            # Rows deleted since they were ranked are simply skipped
+            found = self.queryset.in_bulk(ranked_ids)
+            rows.extend(found[row_id] for row_id in ranked_ids if row_id in found)
+        return offset
+
+    def _fill_unranked(self, rows, value, last_id):
+        """
+        Append unranked rows after the (keyset_field, id) position.
+
+        Returns the last row appended when the page filled up, or None once
+        there is nothing left to show.
+        """
+        field = self.keyset_field
+        if field == 'id':
+            queryset = self.queryset.order_by('-id')
+        else:
+            queryset = self.queryset.order_by(f'-{field}', '-id')
+        batch_size = self.per_page * 2
+        while True:
+            batch = queryset
+            if field == 'id':
+                if last_id is not None:
+                    batch = batch.filter(id__lt=last_id)
+            elif value is not None:
+                batch = batch.filter(
+                    Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': last_id})
+                )
+            batch = list(batch[:batch_size])
+            if not batch:
+                return None
+
+            pipe = self.r.pipeline(transaction=False)
+            for row in batch:
+                pipe.zscore(self.ranking_key, row.id)
+            scores = pipe.execute()
+
+            for row, score in zip(batch, scores):
+                value, last_id = getattr(row, field), row.id
+                if score is not None:
+                    continue
+                rows.append(row)
+                if len(rows) == self.per_page:
+                    return row
+
+            if len(batch) < batch_size:
+                return None
+
+    @staticmethod
+    def encode_cursor(position):
+        if position[0] == 'r':
+            raw = f'r:{position[1]}'
+        else:
+            raw = f'u:{position[1]}|{position[2]}'
+        return urlsafe_base64_encode(force_bytes(raw))
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decode a cursor, falling back to the first page when it is missing or invalid"""
+        if not cursor:
+            return ('r', 0)
+        try:
+            raw = force_str(urlsafe_base64_decode(cursor))
+            kind, value = raw.split(':', 1)
+            if kind == 'r':
+                return ('r', max(int(value), 0))
+            if kind == 'u':
+                value, last_id = value.rsplit('|', 1)
+                if not value:
+                    # Keyset on the id alone
+                    return ('u', None, int(last_id))
+                value = parse_datetime(value)
+                if value is not None:
+                    return ('u', value, int(last_id))
+        except (TypeError, ValueError, UnicodeDecodeError):
+            pass
+        return ('r', 0)
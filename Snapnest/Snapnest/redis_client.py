@@ -0,0 +1,17 @@
+import redis
+from django.conf import settings
+
+# Singleton Redis connection - reuse across all requests
+_redis_connection = None
+
+def get_redis_connection():
+    """Get or create a singleton Redis connection"""
+    global _redis_connection
+    if _redis_connection is None:
+        _redis_connection = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            decode_responses=True  # Automatically decode responses to strings
+        )
+    return _redis_connection
@@ -286,6 +286,55 @@ try:
 except ValueError:
     REDIS_DB = 0
 
+# Responsive renditions generated for every Image by the job worker (images.renditions)
+THUMBNAIL_ALIASES = {
+    'images.Image.image': {
+        f'w{width}': {'size': (width, 0), 'upscale': False}
+        for width in (240, 480, 1080)
+    },
+}
+
+# Shared object cache (e.g. hydrated activity feed targets)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+}
+
+# Image view counts are buffered in Redis and written to the DB by `manage.py flush_image_views`
+IMAGE_VIEWS_FLUSH_INTERVAL = config('IMAGE_VIEWS_FLUSH_INTERVAL', default=30, cast=int)
+IMAGE_VIEWS_FLUSH_BATCH_SIZE = config('IMAGE_VIEWS_FLUSH_BATCH_SIZE', default=500, cast=int)
+# Drive image rankings by distinct viewers (HyperLogLog) instead of raw views
+IMAGE_VIEWS_UNIQUE_RANKING = config('IMAGE_VIEWS_UNIQUE_RANKING', default=False, cast=bool)
+# Proxies in front of the app that append to X-Forwarded-For (Render's load balancer);
+# anonymous viewers are identified by the address the outermost of them saw
+TRUSTED_PROXY_COUNT = config('TRUSTED_PROXY_COUNT', default=1, cast=int)
+
+# Side effects (actions, feed fan-out, counters, notifications) run on `manage.py run_jobs`
+JOBS_EAGER = config('JOBS_EAGER', default=False, cast=bool)
+# Worker processes started by run_jobs; bookmark processing is CPU-bound
+JOBS_WORKER_PROCESSES = config('JOBS_WORKER_PROCESSES', default=2, cast=int)
+JOBS_MAX_ATTEMPTS = config('JOBS_MAX_ATTEMPTS', default=5, cast=int)
+# Seconds before the first retry; doubled for each further attempt
+JOBS_RETRY_DELAY = config('JOBS_RETRY_DELAY', default=10, cast=int)
+
+# Activity feeds are pushed into per-follower Redis sorted sets when an action is created
+FEED_MAX_LENGTH = config('FEED_MAX_LENGTH', default=800, cast=int)
+# Accounts with more followers are not fanned out; their actions are merged in at read time
+FEED_FANOUT_MAX_FOLLOWERS = config('FEED_FANOUT_MAX_FOLLOWERS', default=10000, cast=int)
+
+# Chat messages are broadcast as soon as they have an id and written in micro-batches (chat.writer)
+CHAT_WRITE_BATCH_SIZE = config('CHAT_WRITE_BATCH_SIZE', default=100, cast=int)
+CHAT_WRITE_BATCH_DELAY_MS = config('CHAT_WRITE_BATCH_DELAY_MS', default=20, cast=int)
+# Hold each broadcast until its batch has committed
+CHAT_DURABLE_BROADCAST = config('CHAT_DURABLE_BROADCAST', default=False, cast=bool)
+
+# Users are online while their notification socket heartbeats (every 25s) within this many seconds
+PRESENCE_TTL = config('PRESENCE_TTL', default=60, cast=int)
+# Most users whose presence changes one socket subscribes to
+PRESENCE_MAX_INTERESTS = config('PRESENCE_MAX_INTERESTS', default=500, cast=int)
+
 
 CORS_ALLOWED_ORIGINS = config(
     'CORS_ALLOWED_ORIGINS', 
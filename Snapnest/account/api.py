@@ -5,7 +5,7 @@ from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
 from .models import Profile, Contact
 from .serializers import UserSerializer
-from actions.utils import create_action
+from actions.jobs import queue_action
 
 User = get_user_model()
 
@@ -24,7 +24,7 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
             user_from=request.user,
             user_to=user_to_follow
         )
-        create_action(request.user, 'is following', user_to_follow)
+        queue_action(request.user, 'is following', user_to_follow)
         return Response({'status': 'following'})
 
     @action(detail=True, methods=['post'])
@@ -12,7 +12,12 @@ from .serializers import (
     RegisterSerializer,
     ProfileSerializer
 )
-from actions.utils import create_action
+from actions.jobs import queue_action
+from Snapnest.pagination import CreatedCursorPagination, RankedKeysetPaginator, UserCursorPagination
+from Snapnest.redis_client import get_redis_connection
+from rest_framework.utils.urls import replace_query_param
+from django.db.models import Q
+from .discover import get_discover_key
 from django.shortcuts import get_object_or_404
 
 # New imports for password reset
@@ -23,6 +28,14 @@ from django.core.mail import send_mail
 from django.conf import settings
 
 User = get_user_model()
+r = get_redis_connection()
+
+DISCOVER_PAGE_SIZE = 20
+
+
+def followers_count(user):
+    """Read the freshly updated denormalized follower count for a follow response"""
+    return Profile.objects.filter(user=user).values_list('followers_count', flat=True).first() or 0
 
 
 # 🔹 User List & Detail
@@ -31,18 +44,21 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
     lookup_field = 'username'
-    pagination_class = None # Return all users at once for discover/chat list
+    pagination_class = UserCursorPagination
 
     def get_queryset(self):
-        # Optimize queries with select_related and prefetch_related
-        queryset = User.objects.filter(is_active=True).select_related('profile').prefetch_related(
-            'rel_from_set',  # Following
-            'rel_to_set',    # Followers
-            'images_created' # Posts
-        )
+        # Follower/following/post counts live on the profile, so no prefetching is needed
+        queryset = User.objects.filter(is_active=True).select_related('profile')
         username = self.request.query_params.get('username', None)
         if username is not None:
             queryset = queryset.filter(username=username)
+        search = self.request.query_params.get('search', None)
+        if search:
+            queryset = queryset.filter(
+                Q(username__icontains=search) |
+                Q(first_name__icontains=search) |
+                Q(last_name__icontains=search)
+            )
         return queryset
 
     def get_serializer_context(self):
@@ -50,6 +66,28 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
         context['request'] = self.request
         return context
 
+    @action(detail=False, methods=['get'])
+    def discover(self, request):
+        """
+        Discover/chat-contacts list: the viewer's most relevant users first
+        (mutual follows, follows, recent chat partners), then everyone else
+        newest-first. Relevance is cached per viewer in Redis and dropped on
+        follow changes.
+        """
+        paginator = RankedKeysetPaginator(
+            r,
+            DISCOVER_PAGE_SIZE,
+            self.get_queryset().exclude(id=request.user.id),
+            get_discover_key(r, request.user),
+            keyset_field='id',
+        )
+        page = paginator.page(request.query_params.get('cursor'))
+        next_url = None
+        if page.has_next():
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', page.next_cursor)
+        serializer = self.get_serializer(page.object_list, many=True)
+        return Response({'next': next_url, 'results': serializer.data})
+
     @action(detail=True, methods=['post'])
     def follow(self, request, username=None):
         user_to_follow = self.get_object()
@@ -66,14 +104,14 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
             return Response({
                 'status': 'unfollowed', 
                 'following': False,
-                'followers_count': user_to_follow.rel_to_set.count()
+                'followers_count': followers_count(user_to_follow)
             })
         
-        create_action(request.user, 'is following', user_to_follow)
+        queue_action(request.user, 'is following', user_to_follow)
         return Response({
             'status': 'followed', 
             'following': True,
-            'followers_count': user_to_follow.rel_to_set.count()
+            'followers_count': followers_count(user_to_follow)
         })
 
     @action(detail=True, methods=['post'])
@@ -87,40 +125,30 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
         return Response({
             'status': 'unfollowed', 
             'following': False,
-            'followers_count': user_to_unfollow.rel_to_set.count()
+            'followers_count': followers_count(user_to_unfollow)
         })
 
     @action(detail=True, methods=['get'])
     def followers(self, request, username=None):
         user = self.get_object()
         # Get users who follow this user (user_from in Contact where user_to=user)
-        followers_contacts = user.rel_to_set.select_related('user_from__profile').all()
-        follower_users = [contact.user_from for contact in followers_contacts]
-        
-        # Paginate the results
-        page = self.paginate_queryset(follower_users)
-        if page is not None:
-            serializer = UserSerializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = UserSerializer(follower_users, many=True, context={'request': request})
-        return Response(serializer.data)
+        followers_contacts = user.rel_to_set.select_related('user_from__profile')
+        return self.paginate_contacts(followers_contacts, 'user_from')
 
     @action(detail=True, methods=['get'])
     def following(self, request, username=None):
         user = self.get_object()
         # Get users this user follows (user_to in Contact where user_from=user)
-        following_contacts = user.rel_from_set.select_related('user_to__profile').all()
-        following_users = [contact.user_to for contact in following_contacts]
-        
-        # Paginate the results
-        page = self.paginate_queryset(following_users)
-        if page is not None:
-            serializer = UserSerializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = UserSerializer(following_users, many=True, context={'request': request})
-        return Response(serializer.data)
+        following_contacts = user.rel_from_set.select_related('user_to__profile')
+        return self.paginate_contacts(following_contacts, 'user_to')
+
+    def paginate_contacts(self, contacts, user_field):
+        """Cursor-paginate Contact rows by (created, id) and serialize the users on one side"""
+        paginator = CreatedCursorPagination()
+        page = paginator.paginate_queryset(contacts, self.request, view=self)
+        users = [getattr(contact, user_field) for contact in page]
+        serializer = UserSerializer(users, many=True, context={'request': self.request})
+        return paginator.get_paginated_response(serializer.data)
 
 
 # 🔹 Register API
@@ -231,14 +259,14 @@ class FollowToggleAPIView(APIView):
             return Response({
                 'status': 'unfollowed',
                 'following': False,
-                'followers_count': target_user.rel_to_set.count()
+                'followers_count': followers_count(target_user)
             })
         
-        create_action(request.user, 'is following', target_user)
+        queue_action(request.user, 'is following', target_user)
         return Response({
             'status': 'followed',
             'following': True,
-            'followers_count': target_user.rel_to_set.count()
+            'followers_count': followers_count(target_user)
         })
 
 
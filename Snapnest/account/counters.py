@@ -0,0 +1,29 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Contact, Profile
+
+
+def _count(queryset, field):
+    """Correlated COUNT(*) subquery of ``queryset`` rows whose ``field`` is the profile's user"""
+    counts = queryset.filter(**{field: OuterRef('user_id')}).order_by().values(field).annotate(
+        total=Count('pk')
+    ).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def reconcile_profile_counters(queryset=None):
+    """
+    Rebuild the denormalized Profile counters with a single UPDATE.
+
+    Backs `manage.py reconcile_profile_counters`, for repairing drift after
+    bulk operations that bypass the signals in account.signals.
+    """
+    from images.models import Image
+
+    queryset = queryset if queryset is not None else Profile.objects.all()
+    return queryset.update(
+        followers_count=_count(Contact.objects.all(), 'user_to'),
+        following_count=_count(Contact.objects.all(), 'user_from'),
+        posts_count=_count(Image.objects.all(), 'user'),
+    )
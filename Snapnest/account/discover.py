@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from chat.models import Message
+from .models import Contact
+
+DISCOVER_KEY = 'discover:{user_id}'
+# Marks a built score set, so viewers with no candidates are not rebuilt on every request
+DISCOVER_BUILT_KEY = 'discover:{user_id}:built'
+DISCOVER_TTL = 600
+
+# Relevance weights; a mutual follow scores both directions plus the bonus
+FOLLOWING_SCORE = 1
+FOLLOWER_SCORE = 1
+MUTUAL_BONUS = 2
+CHAT_PARTNER_SCORE = 3
+CHAT_RECENCY = timedelta(days=30)
+# Upper bound on rows read from each source when building the scores
+MAX_CANDIDATES = 1000
+
+
+def discover_key(user_id):
+    return DISCOVER_KEY.format(user_id=user_id)
+
+
+def relevance_scores(user):
+    """
+    Score the users ``user`` is most likely to look for: people they follow,
+    their followers (more for mutual follows) and recent chat partners.
+    """
+    scores = {}
+    following = set(
+        Contact.objects.filter(user_from=user).order_by('-created')
+        .values_list('user_to_id', flat=True)[:MAX_CANDIDATES]
+    )
+    followers = set(
+        Contact.objects.filter(user_to=user).order_by('-created')
+        .values_list('user_from_id', flat=True)[:MAX_CANDIDATES]
+    )
+    for user_id in following:
+        scores[user_id] = scores.get(user_id, 0) + FOLLOWING_SCORE
+    for user_id in followers:
+        scores[user_id] = scores.get(user_id, 0) + FOLLOWER_SCORE
+    for user_id in following & followers:
+        scores[user_id] += MUTUAL_BONUS
+
+    recent = Message.objects.filter(
+        Q(sender=user) | Q(receiver=user),
+        timestamp__gte=timezone.now() - CHAT_RECENCY
+    ).order_by('-timestamp').values_list('sender_id', 'receiver_id')[:MAX_CANDIDATES]
+    partners = {sender if sender != user.id else receiver for sender, receiver in recent}
+    for user_id in partners:
+        scores[user_id] = scores.get(user_id, 0) + CHAT_PARTNER_SCORE
+
+    scores.pop(user.id, None)
+    return scores
+
+
+def get_discover_key(redis_conn, user):
+    """Return the viewer's cached relevance sorted set, building it if it has expired"""
+    key = discover_key(user.id)
+    built_key = DISCOVER_BUILT_KEY.format(user_id=user.id)
+    if redis_conn.exists(built_key):
+        return key
+
+    scores = relevance_scores(user)
+    pipe = redis_conn.pipeline()
+    pipe.delete(key)
+    if scores:
+        pipe.zadd(key, scores)
+        pipe.expire(key, DISCOVER_TTL)
+    pipe.set(built_key, 1, ex=DISCOVER_TTL)
+    pipe.execute()
+    return key
+
+
+def invalidate_discover(redis_conn, *user_ids):
+    """Drop cached relevance for ``user_ids``; called when they follow or unfollow"""
+    keys = []
+    for user_id in user_ids:
+        keys += [discover_key(user_id), DISCOVER_BUILT_KEY.format(user_id=user_id)]
+    redis_conn.delete(*keys)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from account.counters import reconcile_profile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute Profile follower, following and post counters from the source tables'
+
+    def handle(self, *args, **options):
+        updated = reconcile_profile_counters()
+        self.stdout.write(f'Reconciled counters for {updated} profiles')
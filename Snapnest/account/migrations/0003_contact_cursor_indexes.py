@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 02:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0002_contact'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['user_to', '-created', '-id'], name='account_con_user_to_bf173d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contact',
+            index=models.Index(fields=['user_from', '-created', '-id'], name='account_con_user_fr_a2a086_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 6.0 on 2026-10-18 02:35
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Profile = apps.get_model('account', 'Profile')
+    Contact = apps.get_model('account', 'Contact')
+    Image = apps.get_model('images', 'Image')
+
+    def count(model, field):
+        counts = model.objects.filter(**{field: OuterRef('user_id')}).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+        return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+    Profile.objects.update(
+        followers_count=count(Contact, 'user_to'),
+        following_count=count(Contact, 'user_from'),
+        posts_count=count(Image, 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0003_contact_cursor_indexes'),
+        ('images', '0009_image_created_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
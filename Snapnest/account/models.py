@@ -18,6 +18,12 @@ class Profile(models.Model):
         blank=True
     )
 
+    # Denormalized counters, kept in step by account.signals.
+    # `manage.py reconcile_profile_counters` rebuilds them from the source tables.
+    followers_count=models.PositiveIntegerField(default=0)
+    following_count=models.PositiveIntegerField(default=0)
+    posts_count=models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return f'Profile of {self.user.username}'
 
@@ -45,7 +51,10 @@ class Contact(models.Model):
 
     class Meta:
         indexes=[
-            models.Index(fields=['-created'])
+            models.Index(fields=['-created']),
+            # Back the cursor-paginated followers/following lists
+            models.Index(fields=['user_to', '-created', '-id']),
+            models.Index(fields=['user_from', '-created', '-id']),
         ]
         ordering=['-created']
         
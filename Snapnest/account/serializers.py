@@ -11,6 +11,24 @@ class SimpleProfileSerializer(serializers.ModelSerializer):
         fields = ['photo', 'date_of_birth']
 
 
+class UserListSerializer(serializers.ListSerializer):
+    """Resolve which of the listed users the viewer follows with a single query"""
+    following_ids = None
+
+    def to_representation(self, data):
+        users = list(data.all() if hasattr(data, 'all') else data)
+        request = self.context.get('request')
+        if 'following_ids' not in self.context and request and request.user.is_authenticated:
+            # Kept on this list rather than the shared context: it only covers these users
+            self.following_ids = set(
+                Contact.objects.filter(
+                    user_from=request.user,
+                    user_to__in=[user.id for user in users]
+                ).values_list('user_to_id', flat=True)
+            )
+        return super().to_representation(users)
+
+
 class UserSerializer(serializers.ModelSerializer):
     is_following = serializers.SerializerMethodField()
     followers_count = serializers.SerializerMethodField()
@@ -21,26 +39,42 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'is_following', 'followers_count', 'following_count', 'posts_count', 'profile']
+        list_serializer_class = UserListSerializer
     
     def get_is_following(self, obj):
         request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return Contact.objects.filter(
-                user_from=request.user,
-                user_to=obj
-            ).exists()
-        return False
+        if not (request and request.user.is_authenticated):
+            return False
+
+        # Every follow of the viewer, set once per request by the view or below;
+        # otherwise the follows among the users of the list being serialized
+        following_ids = self.context.get('following_ids')
+        if following_ids is None:
+            following_ids = getattr(self.parent, 'following_ids', None)
+        if following_ids is None:
+            if self.root is self:
+                return Contact.objects.filter(user_from=request.user, user_to=obj).exists()
+            # Nested inside another list (e.g. actions): load the viewer's follows once
+            following_ids = set(
+                Contact.objects.filter(user_from=request.user).values_list('user_to_id', flat=True)
+            )
+            self.context['following_ids'] = following_ids
+        return obj.id in following_ids
     
     def get_followers_count(self, obj):
-        # Use Contact model's reverse relationship instead of removed 'followers' field
-        return obj.rel_to_set.count()
+        # Denormalized on Profile (see account.signals)
+        return self._profile_counter(obj, 'followers_count')
     
     def get_following_count(self, obj):
-        # Use Contact model's reverse relationship instead of removed 'following' field
-        return obj.rel_from_set.count()
+        return self._profile_counter(obj, 'following_count')
 
     def get_posts_count(self, obj):
-        return obj.images_created.count()
+        return self._profile_counter(obj, 'posts_count')
+
+    def _profile_counter(self, obj, field):
+        if hasattr(obj, 'profile'):
+            return getattr(obj.profile, field)
+        return 0
 
     def get_profile(self, obj):
         if hasattr(obj, 'profile'):
@@ -53,25 +87,14 @@ class ProfileSerializer(serializers.ModelSerializer):
     first_name = serializers.CharField(source='user.first_name', required=False)
     last_name = serializers.CharField(source='user.last_name', required=False)
     email = serializers.EmailField(source='user.email', required=False)
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
-    posts_count = serializers.SerializerMethodField()
+    followers_count = serializers.IntegerField(read_only=True)
+    following_count = serializers.IntegerField(read_only=True)
+    posts_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Profile
         fields = ['date_of_birth', 'photo', 'user', 'first_name', 'last_name', 'email', 'followers_count', 'following_count', 'posts_count']
     
-    def get_followers_count(self, obj):
-        # Use Contact model's reverse relationship instead of removed 'followers' field
-        return obj.user.rel_to_set.count()
-    
-    def get_following_count(self, obj):
-        # Use Contact model's reverse relationship instead of removed 'following' field
-        return obj.user.rel_from_set.count()
-
-    def get_posts_count(self, obj):
-        return obj.user.images_created.count()
-
     def validate_email(self, value):
         user = self.instance.user if self.instance else None
         if User.objects.filter(email=value).exclude(pk=user.pk if user else None).exists():
@@ -0,0 +1,51 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from Snapnest.redis_client import get_redis_connection
+
+from .discover import invalidate_discover
+from .models import Contact, Profile
+
+
+def adjust_counter(user_id, field, amount):
+    """Atomically add ``amount`` to a Profile counter without reading the row first"""
+    Profile.objects.filter(user_id=user_id).update(
+        **{field: Greatest(F(field) + amount, 0)}
+    )
+
+
+def follow_changed(contact):
+    """Both sides' discover rankings depend on the follow graph"""
+    user_ids = (contact.user_from_id, contact.user_to_id)
+    transaction.on_commit(
+        lambda: invalidate_discover(get_redis_connection(), *user_ids)
+    )
+
+
+@receiver(post_save, sender=Contact)
+def contact_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_counter(instance.user_to_id, 'followers_count', 1)
+        adjust_counter(instance.user_from_id, 'following_count', 1)
+        follow_changed(instance)
+
+
+@receiver(post_delete, sender=Contact)
+def contact_deleted(sender, instance, **kwargs):
+    adjust_counter(instance.user_to_id, 'followers_count', -1)
+    adjust_counter(instance.user_from_id, 'following_count', -1)
+    follow_changed(instance)
+
+
+@receiver(post_save, sender='images.Image')
+def image_created(sender, instance, created, **kwargs):
+    if created:
+        adjust_counter(instance.user_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender='images.Image')
+def image_deleted(sender, instance, **kwargs):
+    adjust_counter(instance.user_id, 'posts_count', -1)
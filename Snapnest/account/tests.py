@@ -1,3 +1,166 @@
+from io import StringIO
+from unittest import mock
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework import status
+from django.core.management import call_command
+from account.models import Contact, Profile
+from account.serializers import UserSerializer
+from account.api_views import r
+from account.discover import invalidate_discover
+from chat.models import Message
+from images.models import Image
 
-# Create your tests here.
+User = get_user_model()
+
+
+class FollowListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='star', email='star@example.com', password='password123')
+        self.client.force_authenticate(user=self.user)
+        self.fans = [
+            User.objects.create_user(username=f'fan{i}', email=f'fan{i}@example.com', password='password123')
+            for i in range(22)
+        ]
+        for fan in self.fans:
+            Contact.objects.create(user_from=fan, user_to=self.user)
+
+    def test_followers_are_cursor_paginated_newest_first(self):
+        response = self.client.get('/api/users/star/followers/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        usernames = [u['username'] for u in response.data['results']]
+        self.assertEqual(usernames[0], 'fan21')
+        self.assertEqual(len(usernames), 20)
+
+        response = self.client.get(response.data['next'])
+        usernames += [u['username'] for u in response.data['results']]
+        self.assertEqual(sorted(usernames), sorted(fan.username for fan in self.fans))
+        self.assertIsNone(response.data['next'])
+
+
+class ProfileCounterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.create_user(username='alice', email='alice@example.com', password='password123')
+        self.bob = User.objects.create_user(username='bob', email='bob@example.com', password='password123')
+        self.client.force_authenticate(user=self.alice)
+
+    def counters(self, user):
+        return Profile.objects.values_list(
+            'followers_count', 'following_count', 'posts_count'
+        ).get(user=user)
+
+    def test_follow_toggle_maintains_counters(self):
+        response = self.client.post('/api/users/bob/follow/')
+        self.assertEqual(response.data['followers_count'], 1)
+        self.assertEqual(self.counters(self.bob), (1, 0, 0))
+        self.assertEqual(self.counters(self.alice), (0, 1, 0))
+
+        response = self.client.post('/api/users/bob/follow/')
+        self.assertEqual(response.data['followers_count'], 0)
+        self.assertEqual(self.counters(self.alice), (0, 0, 0))
+
+    def test_posts_count_and_reconcile(self):
+        image = Image.objects.create(user=self.alice, title='Mine')
+        self.assertEqual(self.counters(self.alice), (0, 0, 1))
+        self.assertEqual(self.client.get('/api/users/alice/').data['posts_count'], 1)
+        image.delete()
+        self.assertEqual(self.counters(self.alice), (0, 0, 0))
+
+        Contact.objects.bulk_create([Contact(user_from=self.bob, user_to=self.alice)])
+        self.assertEqual(self.counters(self.alice), (0, 0, 0))
+        call_command('reconcile_profile_counters', stdout=StringIO())
+        self.assertEqual(self.counters(self.alice), (1, 0, 0))
+        self.assertEqual(self.counters(self.bob), (0, 1, 0))
+
+
+class IsFollowingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='password123')
+        self.client.force_authenticate(user=self.viewer)
+
+    def add_users(self, count, followed):
+        for i in range(count):
+            user = User.objects.create_user(username=f'user{User.objects.count()}', password='password123')
+            if i < followed:
+                Contact.objects.create(user_from=self.viewer, user_to=user)
+
+    def list_users(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/')
+        return response, len(queries)
+
+    def test_is_following_costs_constant_queries(self):
+        self.add_users(5, followed=2)
+        response, few = self.list_users()
+        following = [u['username'] for u in response.data['results'] if u['is_following']]
+        self.assertEqual(len(following), 2)
+
+        self.add_users(10, followed=3)
+        response, many = self.list_users()
+        self.assertEqual(sum(u['is_following'] for u in response.data['results']), 5)
+        self.assertEqual(few, many)
+
+
+    def test_lists_sharing_a_context_resolve_their_own_follows(self):
+        self.add_users(2, followed=0)
+        self.add_users(1, followed=1)
+        strangers = User.objects.filter(rel_to_set__isnull=True).exclude(id=self.viewer.id)
+        followed = User.objects.filter(rel_to_set__user_from=self.viewer)
+        request = APIRequestFactory().get('/api/users/')
+        request.user = self.viewer
+        # e.g. two nested user lists in one response
+        context = {'request': request}
+        UserSerializer(strangers, many=True, context=context).data
+        data = UserSerializer(followed, many=True, context=context).data
+        self.assertEqual([u['is_following'] for u in data], [True])
+
+
+class DiscoverTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='password123')
+        self.client.force_authenticate(user=self.viewer)
+        self.friend = User.objects.create_user(username='friend', password='password123')
+        self.pen_pal = User.objects.create_user(username='penpal', password='password123')
+        self.strangers = [
+            User.objects.create_user(username=f'stranger{i}', password='password123') for i in range(3)
+        ]
+        Contact.objects.create(user_from=self.viewer, user_to=self.friend)
+        Contact.objects.create(user_from=self.friend, user_to=self.viewer)
+        Message.objects.create(sender=self.pen_pal, receiver=self.viewer, content='hi')
+        invalidate_discover(r, self.viewer.id)
+
+    def tearDown(self):
+        invalidate_discover(r, self.viewer.id)
+
+    def discover(self, url='/api/users/discover/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_relevant_users_first_then_everyone_else(self):
+        data = self.discover()
+        usernames = [u['username'] for u in data['results']]
+        self.assertEqual(usernames, ['friend', 'penpal', 'stranger2', 'stranger1', 'stranger0'])
+        self.assertIsNone(data['next'])
+
+    def test_unranked_users_page_by_id(self):
+        with mock.patch('account.api_views.DISCOVER_PAGE_SIZE', 3):
+            first = self.discover()
+            second = self.discover(first['next'])
+        self.assertEqual([u['username'] for u in first['results']], ['friend', 'penpal', 'stranger2'])
+        self.assertEqual([u['username'] for u in second['results']], ['stranger1', 'stranger0'])
+        self.assertIsNone(second['next'])
+
+    def test_follow_invalidates_cached_relevance(self):
+        self.discover()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/users/stranger0/follow/')
+        usernames = [u['username'] for u in self.discover()['results']]
+        self.assertEqual(usernames[:3], ['friend', 'penpal', 'stranger0'])
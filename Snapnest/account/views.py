@@ -10,8 +10,11 @@ from django.shortcuts import get_object_or_404,render
 from django.http import HttpResponse, JsonResponse
 from django.views.decorators.http import require_POST
 from .models import Contact, Profile
-from actions.utils import create_action
+from actions.jobs import queue_action
 from actions.models import Action
+from actions.feed import timeline
+from actions.targets import attach_targets
+from Snapnest.redis_client import get_redis_connection
 from images.models import Image
 from django.db.models import Q
 from django.contrib.postgres.search import SearchVector, SearchQuery
@@ -23,16 +26,26 @@ User=get_user_model()
 
 @login_required
 def dashboard(request):
-    actions=Action.objects.exclude(user=request.user)
-    following_ids = Contact.objects.filter(user_from=request.user).values_list('user_to', flat=True)
-    
-    if following_ids:
-        actions=actions.filter(user_id__in=following_ids)
-    actions=actions.select_related(
-        'user','user__profile'
-    ).prefetch_related('target')[:10]
+    following_ids = Contact.objects.filter(user_from=request.user).values('user_to')
+
+    # Users created without a profile (e.g. createsuperuser) fall back to counting follows
+    profile = getattr(request.user, 'profile', None)
+    following = profile.following_count if profile is not None else following_ids.exists()
+    if following:
+        actions, _ = timeline(
+            get_redis_connection(), request.user, limit=10, include_own=False,
+            queryset=Action.objects.select_related('user', 'user__profile'),
+        )
+    else:
+        # Not following anyone yet: show what everyone else is doing
+        actions=list(Action.objects.exclude(user=request.user).select_related(
+            'user','user__profile'
+        )[:10])
+    attach_targets(actions)
 
-    images = Image.objects.filter(user__in=following_ids).select_related('user').order_by('-created')[:20]
+    images = Image.objects.filter(
+        user__in=following_ids, status=Image.Status.READY
+    ).select_related('user').order_by('-created')[:20]
 
     return render(
         request,
@@ -77,7 +90,7 @@ def register(request):
 
             new_user.save()
 
-            create_action(new_user,'has created an account')
+            queue_action(new_user,'has created an account')
 
             return render(
                 request,
@@ -161,7 +174,9 @@ def user_search(request):
         # Image search (title, description)
         images = Image.objects.annotate(
             search=SearchVector('title', 'description')
-        ).filter(search=SearchQuery(query)).select_related('user')[:12]
+        ).filter(
+            Q(status=Image.Status.READY) | Q(user=request.user), search=SearchQuery(query)
+        ).select_related('user')[:12]
     return render(
         request,
         'account/user_search.html',
@@ -181,7 +196,7 @@ def user_follow(request):
                     user_from=request.user,
                     user_to=user
                 )
-                create_action(request.user, 'is following', user)
+                queue_action(request.user, 'is following', user)
             else:
                 Contact.objects.filter(
                     user_from=request.user,
@@ -6,23 +6,56 @@ from django.contrib.auth import get_user_model
 from images.models import Image
 from .models import Action
 from .serializers import ActionSerializer
+from rest_framework.utils.urls import replace_query_param
+from Snapnest.redis_client import get_redis_connection
+from .feed import timeline
+from .targets import attach_targets
 
 User = get_user_model()
 
+FEED_PAGE_SIZE = 10  # Story-like horizontal scroll
+
+
 class ActionListApiView(generics.ListAPIView):
     serializer_class = ActionSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        # Get actions from users the current user follows
-        following_ids = self.request.user.rel_from_set.values_list('user_to_id', flat=True)
-        # Include current user's actions as well? Usually good for feedback
-        queryset = Action.objects.filter(user_id__in=list(following_ids) + [self.request.user.id])
-        
-        # Prefetch user and profile to avoid N+1 issues
-        queryset = queryset.select_related('user', 'user__profile')
-        
-        return queryset[:10]  # Limit to 10 for the story-like horizontal scroll
+        # Only used to hydrate the ids read from the feed; prefetch user and profile to avoid N+1 issues
+        return Action.objects.select_related('user', 'user__profile')
+
+    def list(self, request, *args, **kwargs):
+        # Pushed actions come from the Redis feed, the user's own and high-follower accounts' from the DB
+        try:
+            before = int(request.query_params.get('cursor', ''))
+        except ValueError:
+            before = None
+        actions, next_before = timeline(
+            get_redis_connection(), request.user, before, FEED_PAGE_SIZE, self.get_queryset()
+        )
+        next_url = None
+        if next_before is not None:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_before)
+        attach_targets(actions)
+        self._author_ids = {action.user_id for action in actions}
+        serializer = self.get_serializer(actions, many=True)
+        return Response({'next': next_url, 'previous': None, 'results': serializer.data})
+
+    def following_ids(self):
+        if not hasattr(self, '_following_ids'):
+            # Only the authors on this page matter, not everyone the user follows
+            self._following_ids = set(
+                self.request.user.rel_from_set.filter(
+                    user_to_id__in=getattr(self, '_author_ids', ())
+                ).values_list('user_to_id', flat=True)
+            )
+        return self._following_ids
+
+    def get_serializer_context(self):
+        # Nested UserSerializer reads is_following from here instead of querying per action
+        context = super().get_serializer_context()
+        context['following_ids'] = self.following_ids()
+        return context
 
 class ImageLikeApiView(generics.GenericAPIView):
     permission_classes = [IsAuthenticated]
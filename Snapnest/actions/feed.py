@@ -0,0 +1,160 @@
+from django.conf import settings
+from django.db.models import Q
+
+from account.models import Contact, Profile
+from .models import Action
+
+FEED_KEY = 'feed:{user_id}'
+# Marks a feed built from the database; fan-out alone may leave a partial sorted set behind
+FEED_BUILT_KEY = 'feed:{user_id}:built'
+# Feeds of users who stop reading expire; every read pushes the expiry back, and the
+# first read after it rebuilds them
+FEED_TTL = 60 * 60 * 24 * 7
+# Followers fanned out to per pipeline round trip
+FANOUT_CHUNK_SIZE = 1000
+
+
+def feed_key(user_id):
+    return FEED_KEY.format(user_id=user_id)
+
+
+def pushes_to_followers(user_id):
+    """Accounts above the threshold are pulled at read time instead of fanned out"""
+    followers_count = Profile.objects.filter(user_id=user_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    return (followers_count or 0) <= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def _push(pipe, user_id, actions):
+    """Add ``{action_id: score}`` to a feed and trim it to FEED_MAX_LENGTH"""
+    key = feed_key(user_id)
+    pipe.zadd(key, actions)
+    pipe.zremrangebyrank(key, 0, -settings.FEED_MAX_LENGTH - 1)
+    pipe.expire(key, FEED_TTL)
+
+
+def fan_out_action(redis_conn, action):
+    """
+    Push a new action into the feed of every follower of its author.
+
+    Actions are scored by id, which grows with ``created``, so feeds page with
+    a plain score range. Authors with more than FEED_FANOUT_MAX_FOLLOWERS
+    followers are skipped here and merged in by ``timeline`` instead.
+
+    Returns the number of feeds written.
+    """
+    if not pushes_to_followers(action.user_id):
+        return 0
+
+    follower_ids = Contact.objects.filter(user_to_id=action.user_id).values_list(
+        'user_from_id', flat=True
+    ).iterator(chunk_size=FANOUT_CHUNK_SIZE)
+
+    pushed = 0
+    pipe = redis_conn.pipeline(transaction=False)
+    for follower_id in follower_ids:
+        _push(pipe, follower_id, {action.id: action.id})
+        pushed += 1
+        if pushed % FANOUT_CHUNK_SIZE == 0:
+            pipe.execute()
+    pipe.execute()
+    return pushed
+
+
+def pulled_actions(user, include_own=True):
+    """Actions ``timeline`` reads from the database: followed high-follower accounts' and optionally the user's own"""
+    pulled_ids = Contact.objects.filter(
+        user_from=user,
+        user_to__profile__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values('user_to_id')
+    condition = Q(user_id__in=pulled_ids)
+    if include_own:
+        condition |= Q(user=user)
+    return Action.objects.filter(condition)
+
+
+def rebuild_feed(redis_conn, user):
+    """Rebuild a user's feed from the database, e.g. after it expired"""
+    pushed_ids = Contact.objects.filter(
+        user_from=user,
+        user_to__profile__followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values('user_to_id')
+    action_ids = list(
+        Action.objects.filter(user_id__in=pushed_ids)
+        .order_by('-id').values_list('id', flat=True)[:settings.FEED_MAX_LENGTH]
+    )
+    key = feed_key(user.id)
+    pipe = redis_conn.pipeline()
+    pipe.delete(key)
+    if action_ids:
+        _push(pipe, user.id, {action_id: action_id for action_id in action_ids})
+    pipe.set(FEED_BUILT_KEY.format(user_id=user.id), 1, ex=FEED_TTL)
+    pipe.execute()
+    return len(action_ids)
+
+
+def backfill_follow(redis_conn, follower_id, followed_id):
+    """Copy a newly followed account's recent actions into the follower's feed"""
+    if not redis_conn.exists(FEED_BUILT_KEY.format(user_id=follower_id)):
+        # No feed yet; the next read builds it with these actions included
+        return 0
+    if not pushes_to_followers(followed_id):
+        return 0
+    action_ids = list(
+        Action.objects.filter(user_id=followed_id)
+        .order_by('-id').values_list('id', flat=True)[:settings.FEED_MAX_LENGTH]
+    )
+    if action_ids:
+        pipe = redis_conn.pipeline(transaction=False)
+        _push(pipe, follower_id, {action_id: action_id for action_id in action_ids})
+        pipe.execute()
+    return len(action_ids)
+
+
+def remove_follow(redis_conn, follower_id, followed_id):
+    """Drop an unfollowed account's actions from the follower's feed"""
+    action_ids = list(
+        Action.objects.filter(user_id=followed_id)
+        .order_by('-id').values_list('id', flat=True)[:settings.FEED_MAX_LENGTH]
+    )
+    if action_ids:
+        redis_conn.zrem(feed_key(follower_id), *action_ids)
+
+
+def timeline(redis_conn, user, before=None, limit=10, queryset=None, include_own=True):
+    """
+    Return ``(actions, next_before)`` for one page of ``user``'s feed, newest
+    first, older than action id ``before``. ``next_before`` is None on the last page.
+
+    Pushed actions come from one ZREVRANGEBYSCORE on the user's feed; the user's
+    own and high-follower accounts' actions come from one indexed query. The
+    two are merged by id and hydrated with a single ``in_bulk``.
+    """
+    max_score = f'({before}' if before else '+inf'
+    # Reading refreshes the feed's expiry; EXPIRE also reports whether it was built
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.expire(FEED_BUILT_KEY.format(user_id=user.id), FEED_TTL)
+    pipe.expire(feed_key(user.id), FEED_TTL)
+    pipe.zrevrangebyscore(feed_key(user.id), max_score, '-inf', start=0, num=limit)
+    built, _, pushed = pipe.execute()
+    if not built:
+        rebuild_feed(redis_conn, user)
+        pushed = redis_conn.zrevrangebyscore(feed_key(user.id), max_score, '-inf', start=0, num=limit)
+
+    pulled = pulled_actions(user, include_own)
+    if before:
+        pulled = pulled.filter(id__lt=before)
+    pulled = pulled.order_by('-id').values_list('id', flat=True)[:limit]
+
+    action_ids = sorted({int(action_id) for action_id in pushed} | set(pulled), reverse=True)[:limit]
+    next_before = action_ids[-1] if len(action_ids) == limit else None
+    return hydrate(action_ids, queryset), next_before
+
+
+def hydrate(action_ids, queryset=None):
+    """Load ``action_ids`` in one query, keeping their order and skipping deleted rows"""
+    if queryset is None:
+        queryset = Action.objects.all()
+    found = queryset.in_bulk(action_ids)
+    return [found[action_id] for action_id in action_ids if action_id in found]
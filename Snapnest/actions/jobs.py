@@ -0,0 +1,62 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+
+from Snapnest.jobs import enqueue
+from images.models import Image
+from .utils import create_action
+
+User = get_user_model()
+
+
+def queue_action(user, verb, target=None):
+    """Record an action on the job worker instead of inside the request"""
+    target_ct_id = target_id = None
+    if target is not None:
+        target_ct_id = ContentType.objects.get_for_model(target).id
+        target_id = target.pk
+    return enqueue(create_action_job, user.id, verb, target_ct_id, target_id)
+
+
+def target_owner_id(target):
+    """The user to notify about an action on ``target``, if any"""
+    if isinstance(target, Image):
+        return target.user_id
+    if isinstance(target, User):
+        return target.id
+    return None
+
+
+def create_action_job(user_id, verb, target_ct_id=None, target_id=None):
+    """Create the action (fanning it out to feeds) and notify the target's owner"""
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return
+    target = None
+    if target_ct_id is not None:
+        ct = ContentType.objects.get_for_id(target_ct_id)
+        target = ct.model_class()._default_manager.filter(pk=target_id).first()
+        if target is None:
+            # Deleted before the worker got to it
+            return
+
+    if not create_action(user, verb, target):
+        return
+    owner_id = target_owner_id(target)
+    if owner_id is not None and owner_id != user.id:
+        notify_user(owner_id, {
+            'type': 'activity',
+            'user': user.username,
+            'verb': verb,
+            'target': {'type': target._meta.model_name, 'id': target.pk, 'name': str(target)},
+        })
+
+
+def notify_user(user_id, data):
+    """Push ``data`` to the user's NotificationConsumer sockets"""
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(
+        f'notify_{user_id}',
+        {'type': 'notification_message', 'data': data},
+    )
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from account.models import Contact
+from actions.feed import backfill_follow, rebuild_feed
+from Snapnest.redis_client import get_redis_connection
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Backfill Redis activity feeds for recent follows, or rebuild them for given users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            type=int,
+            default=60,
+            help='Replay follows created in the last N minutes',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Rebuild the whole feed of this user id instead (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        r = get_redis_connection()
+
+        if options['user_ids']:
+            for user in User.objects.filter(id__in=options['user_ids']):
+                count = rebuild_feed(r, user)
+                self.stdout.write(f'Rebuilt feed for {user.username} with {count} actions')
+            return
+
+        since = timezone.now() - timedelta(minutes=options['since'])
+        follows = Contact.objects.filter(created__gte=since).values_list('user_from_id', 'user_to_id')
+        backfilled = 0
+        for follower_id, followed_id in follows.iterator():
+            backfill_follow(r, follower_id, followed_id)
+            backfilled += 1
+        self.stdout.write(f'Backfilled feeds for {backfilled} follows')
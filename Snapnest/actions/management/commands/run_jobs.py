@@ -0,0 +1,50 @@
+from multiprocessing import Process
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from Snapnest.jobs import recover, work
+from Snapnest.redis_client import get_redis_connection
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs (actions, feed fan-out, counters, notifications, bookmarks) from the Redis queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for more jobs',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=settings.JOBS_WORKER_PROCESSES,
+            help='Worker processes; image processing is CPU-bound, so use about one per core',
+        )
+
+    def handle(self, *args, **options):
+        recovered = recover(get_redis_connection())
+        if recovered:
+            self.stdout.write(f'Requeued {recovered} unfinished jobs')
+
+        if options['processes'] <= 1:
+            processed = work(get_redis_connection(), burst=options['burst'])
+            self.stdout.write(f'Processed {processed} jobs')
+            return
+
+        # Children must open their own database connections
+        connections.close_all()
+        workers = [
+            Process(target=self.work, args=(options['burst'],))
+            for _ in range(options['processes'])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    @staticmethod
+    def work(burst):
+        work(get_redis_connection(), burst=burst)
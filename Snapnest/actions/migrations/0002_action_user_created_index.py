@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 02:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('actions', '0001_initial'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='action',
+            index=models.Index(fields=['user', '-created', '-id'], name='actions_act_user_id_65f240_idx'),
+        ),
+    ]
@@ -28,6 +28,7 @@ class Action(models.Model):
     class Meta:
         indexes=[
             models.Index(fields=['-created']),
-            models.Index(fields=['target_ct','target_id'])
+            models.Index(fields=['target_ct','target_id']),
+            models.Index(fields=['user','-created','-id'])
         ]
         ordering=['-created']
\ No newline at end of file
@@ -2,12 +2,52 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import Action
 from account.serializers import UserSerializer
+from images.models import Image
 
 User = get_user_model()
 
+
+class ImageTargetSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Image
+        fields = ['id', 'uuid', 'title', 'slug', 'image', 'url']
+
+
+class UserTargetSerializer(serializers.ModelSerializer):
+    photo = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'photo']
+
+    def get_photo(self, obj):
+        profile = getattr(obj, 'profile', None)
+        if profile and profile.photo:
+            return profile.photo.url
+        return None
+
+
+TARGET_SERIALIZERS = {
+    Image: ImageTargetSerializer,
+    User: UserTargetSerializer,
+}
+
+
 class ActionSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    target = serializers.SerializerMethodField()
     
     class Meta:
         model = Action
-        fields = ['id', 'user', 'verb', 'created']
+        fields = ['id', 'user', 'verb', 'created', 'target']
+
+    def get_target(self, obj):
+        # Resolved in bulk by actions.targets.attach_targets before serializing
+        target = obj.target
+        if target is None:
+            return None
+        data = {'type': target._meta.model_name, 'id': target.pk}
+        serializer_class = TARGET_SERIALIZERS.get(type(target))
+        if serializer_class:
+            data.update(serializer_class(target, context=self.context).data)
+        return data
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from account.models import Contact, Profile
+from images.models import Image
+from Snapnest.redis_client import get_redis_connection
+
+from .feed import backfill_follow, remove_follow
+from .targets import invalidate_target
+
+
+@receiver(post_save, sender=Contact)
+def contact_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            lambda: backfill_follow(get_redis_connection(), instance.user_from_id, instance.user_to_id)
+        )
+
+
+@receiver(post_delete, sender=Contact)
+def contact_deleted(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: remove_follow(get_redis_connection(), instance.user_from_id, instance.user_to_id)
+    )
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def target_changed(sender, instance, **kwargs):
+    invalidate_target(sender, instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    # User targets are cached with their profile
+    invalidate_target(get_user_model(), instance.user_id)
@@ -0,0 +1,75 @@
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+
+from images.models import Image
+from .models import Action
+
+User = get_user_model()
+
+TARGET_CACHE_KEY = 'action_target:{ct_id}:{target_id}'
+# Hot targets (popular images, followed users) are served from the cache for this long
+TARGET_CACHE_TTL = 300
+
+# Related rows each target type needs for serialization and templates
+TARGET_RELATED = {
+    Image: ('user',),
+    User: ('profile',),
+}
+
+
+def target_cache_key(ct_id, target_id):
+    return TARGET_CACHE_KEY.format(ct_id=ct_id, target_id=target_id)
+
+
+def invalidate_target(model, pk):
+    """Evict a cached target after it is saved or deleted"""
+    ct = ContentType.objects.get_for_model(model)
+    cache.delete(target_cache_key(ct.id, pk))
+
+
+def _load(ct_id, target_ids):
+    """Fetch one content type's targets with a single query"""
+    model = ContentType.objects.get_for_id(ct_id).model_class()
+    if model is None:
+        return {}
+    queryset = model._default_manager.select_related(*TARGET_RELATED.get(model, ()))
+    return queryset.in_bulk(target_ids)
+
+
+def attach_targets(actions):
+    """
+    Resolve ``action.target`` for a page of actions in bulk.
+
+    Targets are looked up in the shared cache by ``(target_ct, target_id)``
+    first; the misses are loaded with one query per content type and cached
+    for TARGET_CACHE_TTL seconds. A page therefore costs at most one query per
+    target type, and none once its targets are warm. Targets that no longer
+    exist resolve to None without further queries.
+    """
+    actions = [action for action in actions if action.target_ct_id and action.target_id]
+    if not actions:
+        return
+    keys = {
+        target_cache_key(action.target_ct_id, action.target_id): (action.target_ct_id, action.target_id)
+        for action in actions
+    }
+    found = {keys[key]: obj for key, obj in cache.get_many(list(keys)).items()}
+
+    missing = {}
+    for ct_id, target_id in set(keys.values()) - set(found):
+        missing.setdefault(ct_id, []).append(target_id)
+    loaded = {}
+    for ct_id, target_ids in missing.items():
+        for target_id, obj in _load(ct_id, target_ids).items():
+            loaded[(ct_id, target_id)] = obj
+    if loaded:
+        cache.set_many(
+            {target_cache_key(*ref): obj for ref, obj in loaded.items()},
+            TARGET_CACHE_TTL,
+        )
+    found.update(loaded)
+
+    target_field = Action._meta.get_field('target')
+    for action in actions:
+        target_field.set_cached_value(action, found.get((action.target_ct_id, action.target_id)))
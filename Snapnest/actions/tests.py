@@ -1,3 +1,294 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from account.models import Contact, Profile
+from images.models import Image
+from Snapnest import jobs
+from Snapnest.redis_client import get_redis_connection
+from .feed import FEED_BUILT_KEY, feed_key
+from .models import Action
+from .targets import attach_targets
+from .utils import DEDUPE_PENDING_TTL, _dedupe_key, bulk_create_actions, create_action
+
+User = get_user_model()
+r = get_redis_connection()
+
+
+def clear_dedupe_keys():
+    # Ids are reused between tests, so earlier tests' keys would suppress new actions
+    keys = list(r.scan_iter('action_dedupe:*'))
+    if keys:
+        r.delete(*keys)
+
+
+class FeedTests(TestCase):
+    def setUp(self):
+        clear_dedupe_keys()
+        self.client = APIClient()
+        self.reader = User.objects.create_user(username='reader', password='password123')
+        self.friend = User.objects.create_user(username='friend', password='password123')
+        self.celebrity = User.objects.create_user(username='celebrity', password='password123')
+        self.stranger = User.objects.create_user(username='stranger', password='password123')
+        for user in (self.reader, self.friend, self.celebrity, self.stranger):
+            r.delete(feed_key(user.id), FEED_BUILT_KEY.format(user_id=user.id))
+        Contact.objects.create(user_from=self.reader, user_to=self.friend)
+        Contact.objects.create(user_from=self.reader, user_to=self.celebrity)
+        Contact.objects.create(user_from=self.stranger, user_to=self.celebrity)
+        self.client.force_authenticate(user=self.reader)
+
+    def act(self, user, verb):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_action(user, verb)
+
+    def verbs(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [action['verb'] for action in response.data['results']]
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_fan_out_and_pull_are_merged_newest_first(self):
+        self.client.get('/api/actions/')  # builds the reader's feed
+        self.act(self.friend, 'friend 1')
+        self.act(self.celebrity, 'celebrity 1')
+        self.act(self.stranger, 'stranger 1')
+        self.act(self.reader, 'own 1')
+        self.act(self.friend, 'friend 2')
+
+        # Only the friend is pushed; the celebrity has two followers and is pulled
+        self.assertEqual(r.zcard(feed_key(self.reader.id)), 2)
+        self.assertEqual(
+            self.verbs(self.client.get('/api/actions/')),
+            ['friend 2', 'own 1', 'celebrity 1', 'friend 1'],
+        )
+
+    def test_cursor_pages_through_feed(self):
+        for i in range(12):
+            self.act(self.friend, f'friend {i}')
+        response = self.client.get('/api/actions/')
+        verbs = self.verbs(response)
+        self.assertEqual(len(verbs), 10)
+        verbs += self.verbs(self.client.get(response.data['next']))
+        self.assertEqual(verbs, [f'friend {i}' for i in reversed(range(12))])
+
+    def test_reads_keep_the_feed_alive(self):
+        built_key = FEED_BUILT_KEY.format(user_id=self.reader.id)
+        self.client.get('/api/actions/')
+        r.expire(built_key, 60)
+        self.client.get('/api/actions/')
+        self.assertGreater(r.ttl(built_key), 60)
+
+    def test_dashboard_for_user_without_profile(self):
+        Profile.objects.filter(user=self.reader).delete()
+        self.reader.refresh_from_db()
+        self.client.force_login(self.reader)
+        self.act(self.friend, 'friend 1')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([action.verb for action in response.context['actions']], ['friend 1'])
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        self.act(self.stranger, 'stranger 1')
+        self.assertEqual(self.verbs(self.client.get('/api/actions/')), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Contact.objects.create(user_from=self.reader, user_to=self.stranger)
+        self.assertEqual(self.verbs(self.client.get('/api/actions/')), ['stranger 1'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Contact.objects.filter(user_from=self.reader, user_to=self.stranger).delete()
+        self.assertEqual(self.verbs(self.client.get('/api/actions/')), [])
+
+
+class ActionTargetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.reader = User.objects.create_user(username='reader', password='password123')
+        self.author = User.objects.create_user(username='author', password='password123')
+        r.delete(feed_key(self.reader.id), FEED_BUILT_KEY.format(user_id=self.reader.id))
+        Contact.objects.create(user_from=self.reader, user_to=self.author)
+        self.images = [Image.objects.create(user=self.author, title=f'Image {i}') for i in range(3)]
+        for image in self.images:
+            Action.objects.create(user=self.author, verb='likes', target=image)
+        Action.objects.create(user=self.author, verb='is following', target=self.reader)
+        Action.objects.create(user=self.author, verb='has created an account')
+        self.client.force_authenticate(user=self.reader)
+
+    def fresh_actions(self):
+        return list(Action.objects.order_by('-id'))
+
+    def test_one_query_per_content_type_then_cached(self):
+        actions = self.fresh_actions()
+        with self.assertNumQueries(2):
+            attach_targets(actions)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [str(action.target) for action in actions],
+                ['None', 'reader', 'Image 2', 'Image 1', 'Image 0'],
+            )
+
+        actions = self.fresh_actions()
+        with self.assertNumQueries(0):
+            attach_targets(actions)
+
+    def test_update_invalidates_cached_target(self):
+        attach_targets(self.fresh_actions())
+        image = self.images[0]
+        image.title = 'Renamed'
+        image.save()
+
+        actions = self.fresh_actions()
+        with self.assertNumQueries(1):
+            attach_targets(actions)
+        self.assertEqual(actions[-1].target.title, 'Renamed')
+
+    def test_feed_exposes_serialized_targets(self):
+        response = self.client.get('/api/actions/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        targets = [action['target'] for action in response.data['results']]
+        self.assertIsNone(targets[0])
+        self.assertEqual(targets[1]['type'], 'user')
+        self.assertEqual(targets[1]['username'], 'reader')
+        self.assertEqual(targets[2]['type'], 'image')
+        self.assertEqual(targets[2]['title'], 'Image 2')
+
+
+class CreateActionTests(TestCase):
+    def setUp(self):
+        clear_dedupe_keys()
+        self.user = User.objects.create_user(username='liker', password='password123')
+        self.image = Image.objects.create(user=self.user, title='Liked')
+        create_action(self.user, 'warm up')  # caches the ContentType lookups
+
+    def test_single_insert_and_dedupe_within_window(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(create_action(self.user, 'likes', self.image))
+        with self.assertNumQueries(0):
+            self.assertFalse(create_action(self.user, 'likes', self.image))
+        self.assertTrue(create_action(self.user, 'bookmarked image', self.image))
+        self.assertTrue(create_action(self.user, 'likes'))
+        self.assertEqual(Action.objects.filter(verb='likes').count(), 2)
+
+    def test_dedupe_window_starts_at_commit(self):
+        key = _dedupe_key(self.user, 'likes', self.image)
+        # Never committed (as if rolled back): the repeat is only held off briefly
+        with self.captureOnCommitCallbacks(execute=False):
+            self.assertTrue(create_action(self.user, 'likes', self.image))
+        self.assertLessEqual(r.ttl(key), DEDUPE_PENDING_TTL)
+
+        r.delete(key)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(create_action(self.user, 'likes', self.image))
+        self.assertGreater(r.ttl(key), DEDUPE_PENDING_TTL)
+
+    def test_bulk_create_actions_dedupes(self):
+        other = Image.objects.create(user=self.user, title='Other')
+        create_action(self.user, 'likes', self.image)
+        actions = bulk_create_actions([
+            (self.user, 'likes', self.image),
+            (self.user, 'likes', other),
+            (self.user, 'likes', other),
+            (self.user, 'has created an account', None),
+        ])
+        self.assertEqual(
+            [(action.verb, action.target_id) for action in actions],
+            [('likes', other.id), ('has created an account', None)],
+        )
+        self.assertTrue(all(action.id for action in actions))
+
+
+job_calls = []
+
+
+def record_call(value):
+    job_calls.append(value)
+
+
+def failing_job():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        clear_dedupe_keys()
+        job_calls.clear()
+        r.delete(jobs.QUEUE_KEY, jobs.PROCESSING_KEY, jobs.DELAYED_KEY, jobs.DEAD_KEY)
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username='owner', password='password123')
+        self.fan = User.objects.create_user(username='fan', password='password123')
+        self.image = Image.objects.create(user=self.owner, title='Popular')
+        self.client.force_authenticate(user=self.fan)
+
+    def test_like_side_effects_run_on_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/images/{self.image.uuid}/like/')
+        self.assertEqual(response.data['total_likes'], 1)
+        # Nothing but the like itself happened inside the request
+        self.assertFalse(Action.objects.exists())
+        self.assertEqual(r.llen(jobs.QUEUE_KEY), 1)
+
+        self.assertEqual(jobs.work(r, burst=True), 1)
+        self.assertEqual(Action.objects.get().verb, 'likes')
+        self.assertEqual(r.llen(jobs.PROCESSING_KEY), 0)
+
+    def test_orm_like_changes_are_recounted_on_worker(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.images_liked.add(self.image)
+        jobs.work(r, burst=True)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.total_likes, 1)
+
+        # A reverse clear carries no pk_set; the liked images are still recounted
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.images_liked.clear()
+        jobs.work(r, burst=True)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.total_likes, 0)
+
+    def test_idempotency_key_runs_job_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            key = jobs.enqueue(record_call, 'first')
+            jobs.enqueue(record_call, 'again', idempotency_key=key)
+        jobs.work(r, burst=True)
+        self.assertEqual(job_calls, ['first'])
+
+    def test_job_interrupted_mid_run_is_not_lost(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            key = jobs.enqueue(record_call, 'recovered')
+        # A worker took the job and died while running it
+        r.lmove(jobs.QUEUE_KEY, jobs.PROCESSING_KEY, 'RIGHT', 'LEFT')
+        r.set(jobs.DONE_KEY.format(key=key), 'running', ex=jobs.RUNNING_TTL)
+
+        self.assertEqual(jobs.recover(r), 1)
+        jobs.work(r, burst=True)
+        # Deferred while the marker is live, not acknowledged
+        self.assertEqual(job_calls, [])
+        self.assertEqual(r.llen(jobs.PROCESSING_KEY), 0)
+        self.assertEqual(r.zcard(jobs.DELAYED_KEY), 1)
+
+        # Once the running marker expires the retry runs it
+        r.delete(jobs.DONE_KEY.format(key=key))
+        r.zadd(jobs.DELAYED_KEY, {r.zrange(jobs.DELAYED_KEY, 0, 0)[0]: 0})
+        jobs.work(r, burst=True)
+        self.assertEqual(job_calls, ['recovered'])
+
+    @override_settings(JOBS_MAX_ATTEMPTS=2, JOBS_RETRY_DELAY=0)
+    def test_failed_job_is_retried_then_dead_lettered(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue(failing_job)
+        with self.assertLogs('Snapnest.jobs', 'ERROR') as logs:
+            jobs.work(r, burst=True)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(r.llen(jobs.DEAD_KEY), 1)
+        self.assertEqual(r.zcard(jobs.DELAYED_KEY), 0)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue(record_call, 'local')
+            self.assertEqual(job_calls, [])
+        self.assertEqual(job_calls, ['local'])
+        self.assertEqual(r.llen(jobs.QUEUE_KEY), 0)
@@ -1,24 +1,91 @@
-import datetime
 from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from .models import Action
-from django.utils import timezone
+from Snapnest.redis_client import get_redis_connection
+from .feed import fan_out_action
 
-def create_action(user, verb, target=None):
-    now = timezone.now()
-    last_minute = now - datetime.timedelta(seconds=60)
-    similar_actions = Action.objects.filter(
-        user_id=user.id,
-        verb=verb,
-        created__gte=last_minute  # Fix: Change 'created_gte' to 'created__gte'
+# Claimed with SET NX by the first identical action; repeats inside the window are dropped
+DEDUPE_KEY = 'action_dedupe:{user_id}:{target_ct_id}:{target_id}:{verb}'
+DEDUPE_WINDOW = 60
+# A claim only lasts this long until the transaction that wrote the action commits,
+# so an action rolled back with its transaction is not suppressed for the whole window
+DEDUPE_PENDING_TTL = 10
+
+
+def _dedupe_key(user, verb, target):
+    target_ct_id = target_id = ''
+    if target is not None:
+        # get_for_model is served from ContentType's in-process cache after the first call
+        target_ct_id = ContentType.objects.get_for_model(target).id
+        target_id = target.pk
+    return DEDUPE_KEY.format(
+        user_id=user.id, target_ct_id=target_ct_id, target_id=target_id, verb=verb
     )
-    if target:
-        target_ct = ContentType.objects.get_for_model(target)
-        similar_actions = similar_actions.filter(
-            target_ct=target_ct,
-            target_id=target.id
-        )
-    if not similar_actions:
-        action = Action(user=user, verb=verb, target=target)
-        action.save()
-        return True
-    return False
\ No newline at end of file
+
+
+def _fan_out_on_commit(actions, keys):
+    """Once the actions are committed, hold their dedupe keys for the window and fan them out"""
+    def fan_out():
+        r = get_redis_connection()
+        pipe = r.pipeline(transaction=False)
+        for key in keys:
+            pipe.expire(key, DEDUPE_WINDOW)
+        pipe.execute()
+        for action in actions:
+            fan_out_action(r, action)
+    transaction.on_commit(fan_out)
+
+
+def create_action(user, verb, target=None):
+    """
+    Record an action unless an identical one was recorded in the last minute.
+
+    The dedupe check is an atomic SET NX with a TTL in Redis, so concurrent
+    duplicates cannot both pass it, and the database only sees one INSERT.
+    The claim is extended to the full window when the transaction commits.
+    Returns True when the action was created.
+    """
+    r = get_redis_connection()
+    key = _dedupe_key(user, verb, target)
+    if not r.set(key, 1, nx=True, ex=DEDUPE_PENDING_TTL):
+        return False
+    try:
+        action = Action.objects.create(user=user, verb=verb, target=target)
+    except Exception:
+        # Let a retry through if the insert itself failed
+        r.delete(key)
+        raise
+    _fan_out_on_commit([action], [key])
+    return True
+
+
+def bulk_create_actions(entries, batch_size=500):
+    """
+    Create many actions at once for batch jobs.
+
+    ``entries`` is an iterable of ``(user, verb, target)`` tuples. Duplicates are
+    dropped with the same rules as ``create_action``: all keys are claimed in
+    one pipelined round trip and the winners are written with ``bulk_create``.
+    Returns the created actions.
+    """
+    entries = list(entries)
+    if not entries:
+        return []
+    r = get_redis_connection()
+    keys = [_dedupe_key(user, verb, target) for user, verb, target in entries]
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.set(key, 1, nx=True, ex=DEDUPE_PENDING_TTL)
+    claimed = pipe.execute()
+
+    actions = [
+        Action(user=user, verb=verb, target=target)
+        for (user, verb, target), won in zip(entries, claimed) if won
+    ]
+    try:
+        actions = Action.objects.bulk_create(actions, batch_size=batch_size)
+    except Exception:
+        r.delete(*[key for key, won in zip(keys, claimed) if won])
+        raise
+    _fan_out_on_commit(actions, [key for key, won in zip(keys, claimed) if won])
+    return actions
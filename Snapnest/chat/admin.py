@@ -1,8 +1,15 @@
 from django.contrib import admin
-from .models import Message
+from .models import Conversation, Message
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ['user_low', 'user_high', 'created']
+    raw_id_fields = ['user_low', 'user_high']
+    search_fields = ['user_low__username', 'user_high__username']
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ['sender', 'receiver', 'timestamp', 'is_read']
     list_filter = ['timestamp', 'is_read']
     search_fields = ['content', 'sender__username', 'receiver__username']
+    raw_id_fields = ['conversation']
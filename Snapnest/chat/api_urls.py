@@ -1,6 +1,9 @@
 from django.urls import path
-from .api_views import MessageListView
+from .api_views import InboxView, MarkReadView, MessageListView, PresenceView
 
 urlpatterns = [
+    path('inbox/', InboxView.as_view(), name='inbox'),
     path('messages/<int:other_user_id>/', MessageListView.as_view(), name='message-list'),
+    path('messages/<int:other_user_id>/read/', MarkReadView.as_view(), name='message-read'),
+    path('presence/', PresenceView.as_view(), name='presence'),
 ]
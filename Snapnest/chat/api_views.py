@@ -1,16 +1,75 @@
-from rest_framework import generics, permissions
 from django.db.models import Q
-from .models import Message
-from .serializers import MessageSerializer
+from rest_framework import generics, permissions
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from Snapnest.redis_client import get_redis_connection
+from . import presence
+from .inbox import mark_read
+from .models import Conversation, Message
+from .serializers import ConversationSerializer, MessageSerializer
+from Snapnest.pagination import ActivityCursorPagination, TimestampCursorPagination
+
 
 class MessageListView(generics.ListAPIView):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TimestampCursorPagination
+
+    def get_queryset(self):
+        low, high = Conversation.pair(self.request.user.id, self.kwargs.get('other_user_id'))
+        conversation_id = Conversation.objects.filter(
+            user_low_id=low, user_high_id=high
+        ).values_list('id', flat=True).first()
+        if conversation_id is None:
+            return Message.objects.none()
+        # Served by the (conversation, -timestamp, -id) index
+        return Message.objects.filter(conversation_id=conversation_id).select_related('sender')
+
+
+class InboxView(generics.ListAPIView):
+    """
+    The viewer's conversations, most recent activity first.
+
+    Last message, activity time and unread counts are kept on the
+    conversation row (see chat.inbox), so a page is one query.
+    """
+    serializer_class = ConversationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ActivityCursorPagination
 
     def get_queryset(self):
         user = self.request.user
-        other_user_id = self.kwargs.get('other_user_id')
-        return Message.objects.filter(
-            (Q(sender=user) & Q(receiver_id=other_user_id)) |
-            (Q(sender_id=other_user_id) & Q(receiver=user))
-        ).order_by('timestamp')
+        return Conversation.objects.filter(
+            Q(user_low=user) | Q(user_high=user), last_activity__isnull=False
+        ).select_related('user_low__profile', 'user_high__profile', 'last_message')
+
+
+class MarkReadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, other_user_id):
+        low, high = Conversation.pair(request.user.id, other_user_id)
+        conversation = Conversation.objects.filter(user_low_id=low, user_high_id=high).first()
+        if conversation is not None:
+            mark_read(conversation, request.user)
+        return Response({'unread_count': 0})
+
+
+class PresenceView(APIView):
+    """
+    Online state for up to MAX_IDS users in one call: ``GET /api/presence/?ids=1,2,3``
+    returns ``{"1": {"online": true, "last_seen": <epoch seconds>}, ...}``.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    MAX_IDS = 200
+
+    def get(self, request):
+        try:
+            ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value]
+        except ValueError:
+            raise ValidationError({'ids': 'Expected a comma-separated list of user ids.'})
+        if len(ids) > self.MAX_IDS:
+            raise ValidationError({'ids': f'At most {self.MAX_IDS} ids per request.'})
+        statuses = presence.statuses(get_redis_connection(), list(dict.fromkeys(ids)))
+        return Response({str(user_id): status for user_id, status in statuses.items()})
@@ -1,10 +1,19 @@
+import asyncio
 import json
+import logging
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
-from .models import Message
+from django.utils import timezone
+from Snapnest.redis_client import get_redis_connection
+from . import presence
+from .ids import next_message_id
+from .models import Conversation, Message
+from .writer import get_writer
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope['user']
@@ -14,64 +23,53 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         self.other_user_id = self.scope['url_route']['kwargs']['user_id']
         
-        ids = sorted([self.user.id, int(self.other_user_id)])
-        self.room_name = f'chat_{ids[0]}_{ids[1]}'
+        self.room_name = Conversation.room_name_for(self.user.id, self.other_user_id)
+        # Looked up on the first message, so browsing a chat costs no writes
+        self.conversation = None
        
         await self.channel_layer.group_add(self.room_name, self.channel_name)
         await self.accept()
 
-        # Broadcast that user is online to the room
-        await self.channel_layer.group_send(
-            self.room_name,
-            {
-                'type': 'user_status',
-                'user_id': self.user.id,
-                'status': 'online'
-            }
-        )
-        
-        # In a real InMemory setup without Redis, we can't easily query 'all online users'
-        # across different group scopes without a shared state. 
-        # However, for 1-on-1 chat, both users are in the same room.
-        # When we connect, we broadcast. If the other person is there, they will receive it.
-        # To get the other person's status immediately, we can send a 'ping'
-        await self.channel_layer.group_send(
-            self.room_name,
-            {
-                'type': 'status_request',
-                'requester_id': self.user.id
-            }
-        )
+        # The other user's presence comes from the global presence service
+        await self.channel_layer.group_add(presence.presence_group(self.other_user_id), self.channel_name)
+        statuses = await sync_to_async(presence.statuses)(get_redis_connection(), [int(self.other_user_id)])
+        await self.presence_update({
+            'user_id': int(self.other_user_id),
+            'status': 'online' if statuses[int(self.other_user_id)]['online'] else 'offline',
+        })
 
     async def disconnect(self, close_code):
-        # Broadcast that user is offline
         if hasattr(self, 'room_name'):
-            await self.channel_layer.group_send(
-                self.room_name,
-                {
-                    'type': 'user_status',
-                    'user_id': self.user.id,
-                    'status': 'offline'
-                }
-            )
             await self.channel_layer.group_discard(self.room_name, self.channel_name)
+            await self.channel_layer.group_discard(presence.presence_group(self.other_user_id), self.channel_name)
 
     async def receive(self, text_data):
         data = json.loads(text_data)
         message_type = data.get('type', 'chat_message')
 
         if message_type == 'chat_message':
-            message_content = data['message']
-            saved_msg = await self.save_message(message_content)
+            try:
+                message = await self.build_message(data.get('message'))
+            except ValueError:
+                await self.send_safely({'type': 'message_failed', 'client_id': data.get('client_id')})
+                return
+            persisted = get_writer().submit(message)
+            if settings.CHAT_DURABLE_BROADCAST:
+                # Nobody sees a message that could still be lost
+                if not await self.acknowledge(persisted, data.get('client_id')):
+                    return
+            else:
+                asyncio.ensure_future(self.acknowledge(persisted, data.get('client_id')))
             await self.channel_layer.group_send(
                 self.room_name,
                 {
                     'type': 'chat_message',
-                    'id': saved_msg.id,
-                    'message': message_content,
+                    # A string: snowflake ids are past JavaScript's safe integers
+                    'id': str(message.id),
+                    'message': message.content,
                     'sender_id': self.user.id,
                     'sender_username': self.user.username,
-                    'timestamp': saved_msg.timestamp.isoformat()
+                    'timestamp': message.timestamp.isoformat()
                 }
             )
         elif message_type == 'message_reaction':
@@ -139,22 +137,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'sender_id': event['sender_id']
         }))
 
-    async def user_status(self, event):
+    async def presence_update(self, event):
         await self.send(text_data=json.dumps({
             'type': 'user_status',
             'user_id': event['user_id'],
             'status': event['status']
         }))
 
-    async def status_request(self, event):
-        # If someone asks for status, and I am not the requester, I respond
-        if event['requester_id'] != self.user.id:
-            await self.send(text_data=json.dumps({
-                'type': 'user_status',
-                'user_id': self.user.id,
-                'status': 'online'
-            }))
-
     async def typing_indicator(self, event):
         if event['sender_id'] != self.user.id:
             await self.send(text_data=json.dumps({
@@ -167,13 +156,56 @@ class ChatConsumer(AsyncWebsocketConsumer):
         if self.user.id != event['sender_id']:
             await self.send(text_data=json.dumps(event['data']))
 
-    @database_sync_to_async
-    def save_message(self, content):
-        receiver = User.objects.get(id=int(self.other_user_id))
-        return Message.objects.create(sender=self.user, receiver=receiver, content=content)
+    async def build_message(self, content):
+        """
+        An unsaved message with its final id and timestamp, so it can be
+        broadcast before the writer commits it. Raises ValueError for content
+        that could never be stored, so it is not broadcast either.
+        """
+        if not isinstance(content, str) or not content.strip() or '\x00' in content:
+            raise ValueError('Invalid message content')
+        if self.conversation is None:
+            # Once per connection; the receiver is only ever referenced by id
+            self.conversation = await database_sync_to_async(Conversation.for_users)(
+                self.user.id, self.other_user_id
+            )
+        return Message(
+            id=next_message_id(),
+            conversation=self.conversation,
+            sender_id=self.user.id,
+            receiver_id=int(self.other_user_id),
+            content=content,
+            timestamp=timezone.now(),
+        )
+
+    async def acknowledge(self, persisted, client_id):
+        """
+        Wait for the message's batch to commit, then tell the sender with a
+        ``message_ack`` (or ``message_failed``) carrying their ``client_id``.
+        """
+        try:
+            message = await persisted
+        except Exception:
+            await self.send_safely({'type': 'message_failed', 'client_id': client_id})
+            return False
+        await self.send_safely({'type': 'message_ack', 'id': str(message.id), 'client_id': client_id})
+        return True
+
+    async def send_safely(self, data):
+        try:
+            await self.send(text_data=json.dumps(data))
+        except Exception:
+            # The sender disconnected before their message was written
+            logger.debug('Could not deliver %s', data['type'])
 
 
 class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    The per-user socket every page keeps open. It also carries presence: the
+    client heartbeats over it, and it subscribes to the presence groups of the
+    people the user follows or chats with.
+    """
+
     async def connect(self):
         self.user = self.scope['user']
         if not self.user.is_authenticated:
@@ -184,9 +216,53 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         await self.channel_layer.group_add(self.group_name, self.channel_name)
         await self.accept()
 
+        self.interests = await database_sync_to_async(presence.interests)(self.user.id)
+        for user_id in self.interests:
+            await self.channel_layer.group_add(presence.presence_group(user_id), self.channel_name)
+        if await sync_to_async(presence.connect)(get_redis_connection(), self.user.id):
+            await self.publish_presence(self.user.id, 'online')
+
     async def disconnect(self, close_code):
         if hasattr(self, 'group_name'):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        if hasattr(self, 'interests'):
+            for user_id in self.interests:
+                await self.channel_layer.group_discard(presence.presence_group(user_id), self.channel_name)
+            if await sync_to_async(presence.disconnect)(get_redis_connection(), self.user.id):
+                await self.publish_presence(self.user.id, 'offline')
+
+    async def receive(self, text_data):
+        data = json.loads(text_data)
+        if data.get('type') == 'heartbeat':
+            await self.beat_and_publish()
+
+    def beat(self):
+        r = get_redis_connection()
+        came_online = presence.heartbeat(r, self.user.id)
+        # Users whose sockets died without disconnecting
+        return came_online, presence.sweep_if_due(r)
+
+    async def beat_and_publish(self):
+        came_online, gone = await sync_to_async(self.beat)()
+        if came_online:
+            await self.publish_presence(self.user.id, 'online')
+        for user_id in gone:
+            await self.publish_presence(user_id, 'offline')
+
+    async def publish_presence(self, user_id, status):
+        # One send per change; the channel layer fans it out to interested sockets
+        await self.channel_layer.group_send(presence.presence_group(user_id), {
+            'type': 'presence_update',
+            'user_id': user_id,
+            'status': status,
+        })
+
+    async def presence_update(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'presence',
+            'user_id': event['user_id'],
+            'status': event['status'],
+        }))
 
     async def notification_message(self, event):
-        await self.send(text_data=json.dumps(event['data']))
\ No newline at end of file
+        await self.send(text_data=json.dumps(event['data']))
@@ -0,0 +1,48 @@
+import threading
+import time
+
+from Snapnest.redis_client import get_redis_connection
+
+# Snowflake ids: 41 bits of milliseconds since EPOCH_MS, 10 bits of worker id and
+# a 12-bit per-millisecond sequence. They grow with time, fit a BIGINT and stay
+# far above the ids handed out by the table's own sequence.
+EPOCH_MS = 1767225600000  # 2026-01-01T00:00:00Z
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+# Incremented once by every process that generates ids
+WORKER_KEY = 'chat:snowflake_workers'
+
+
+class SnowflakeGenerator:
+    def __init__(self, worker_id):
+        self.worker_id = worker_id % (1 << WORKER_BITS)
+        self.last_ms = -1
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def next_id(self):
+        with self.lock:
+            # Never step back, even if the wall clock does
+            now = max(int(time.time() * 1000) - EPOCH_MS, self.last_ms)
+            if now == self.last_ms:
+                self.sequence = (self.sequence + 1) & ((1 << SEQUENCE_BITS) - 1)
+                if self.sequence == 0:
+                    # 4096 ids this millisecond already; wait for the next one
+                    while now <= self.last_ms:
+                        time.sleep(0.0001)
+                        now = int(time.time() * 1000) - EPOCH_MS
+            else:
+                self.sequence = 0
+            self.last_ms = now
+            return (now << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self.sequence
+
+
+_generator = None
+
+
+def next_message_id():
+    """A unique, time-ordered Message id that needs no database round trip"""
+    global _generator
+    if _generator is None:
+        _generator = SnowflakeGenerator(get_redis_connection().incr(WORKER_KEY))
+    return _generator.next_id()
@@ -0,0 +1,55 @@
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, Q, When
+
+from .models import Conversation, Message
+
+
+def record_messages(messages):
+    """
+    Insert unsaved messages with one ``bulk_create`` and, in the same
+    transaction, update each conversation's inbox entry: the newest message
+    moves to the top and the receivers' unread counts go up.
+
+    Counters are incremented in SQL, so concurrent writers do not lose
+    updates; the last message only moves forward in time.
+    """
+    by_conversation = {}
+    for message in messages:
+        by_conversation.setdefault(message.conversation_id, []).append(message)
+
+    with transaction.atomic():
+        Message.objects.bulk_create(messages)
+        for conversation_messages in by_conversation.values():
+            conversation = conversation_messages[0].conversation
+            latest = max(conversation_messages, key=lambda message: (message.timestamp, message.pk))
+            unread = {}
+            for message in conversation_messages:
+                field = conversation.unread_field(message.receiver_id)
+                unread[field] = unread.get(field, 0) + 1
+            is_newer = Q(last_activity__isnull=True) | Q(last_activity__lte=latest.timestamp)
+            Conversation.objects.filter(pk=conversation.pk).update(
+                last_message=Case(
+                    When(is_newer, then=latest.pk), default=F('last_message'), output_field=BigIntegerField()
+                ),
+                last_activity=Case(When(is_newer, then=latest.timestamp), default=F('last_activity')),
+                **{field: F(field) + count for field, count in unread.items()},
+            )
+    return messages
+
+
+def record_message(conversation, sender, receiver_id, content):
+    """Save a single message the same way as ``record_messages``"""
+    message = Message(conversation=conversation, sender=sender, receiver_id=receiver_id, content=content)
+    record_messages([message])
+    return message
+
+
+def mark_read(conversation, user):
+    """Mark everything ``user`` has received in ``conversation`` as read"""
+    with transaction.atomic():
+        # Holds back record_messages' counter increment until the reset commits,
+        # so a message written meanwhile is still counted
+        Conversation.objects.select_for_update().filter(pk=conversation.pk).values_list('pk').first()
+        # Served by the partial index on unread messages
+        Message.objects.filter(conversation=conversation, receiver=user, is_read=False).update(is_read=True)
+        Conversation.objects.filter(pk=conversation.pk).update(**{conversation.unread_field(user.id): 0})
@@ -1,35 +1,179 @@
-import json
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from urllib.parse import parse_qs
+
 from channels.db import database_sync_to_async
+from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import AccessToken
-from django.contrib.auth import get_user_model
 
+from Snapnest.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# The user a token authenticates, cached until the token expires
+AUTH_CACHE_KEY = 'ws_auth:{jti}'
+# Bumped (deleted) whenever the user is saved, which invalidates every cached token of theirs
+USER_GENERATION_KEY = 'ws_auth_user:{user_id}'
+
+# Connect outcomes and latency buckets, summed across processes in this Redis hash
+AUTH_STATS_KEY = 'ws_auth:stats'
+AUTH_STATS_INTERVAL = 10
+LATENCY_BUCKETS_MS = (1, 5, 25, 100)
+
+
+class UserSnapshot:
+    """
+    The fields consumers read from ``scope['user']``, instead of a full ORM
+    instance. Pass ``user.id`` (not the snapshot) to model foreign keys.
+    """
+    __slots__ = ('id', 'username', 'is_active', 'is_staff', 'is_superuser', 'generation')
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, is_active, is_staff, is_superuser, generation=None):
+        self.id = id
+        self.username = username
+        self.is_active = is_active
+        self.is_staff = is_staff
+        self.is_superuser = is_superuser
+        self.generation = generation
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __str__(self):
+        return self.username
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+class AuthMetrics:
+    """
+    Per-process connect counters, added to AUTH_STATS_KEY every
+    AUTH_STATS_INTERVAL seconds so connects never wait on the write.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.last_flush = time.monotonic()
+
+    def record(self, outcome, seconds):
+        """Count one connect; returns the counts to flush once the interval has passed"""
+        elapsed_ms = seconds * 1000
+        bucket = next((f'le_{limit}ms' for limit in LATENCY_BUCKETS_MS if elapsed_ms <= limit), 'le_inf')
+        counts = None
+        with self.lock:
+            for field, amount in ((outcome, 1), (bucket, 1), ('latency_ms_total', elapsed_ms)):
+                self.counts[field] = self.counts.get(field, 0) + amount
+            if time.monotonic() - self.last_flush >= AUTH_STATS_INTERVAL:
+                counts, self.counts = self.counts, {}
+                self.last_flush = time.monotonic()
+        return counts
+
+    def flush(self, counts):
+        try:
+            pipe = get_redis_connection().pipeline(transaction=False)
+            for field, amount in counts.items():
+                if isinstance(amount, float):
+                    pipe.hincrbyfloat(AUTH_STATS_KEY, field, round(amount, 3))
+                else:
+                    pipe.hincrby(AUTH_STATS_KEY, field, amount)
+            pipe.execute()
+        except Exception:
+            logger.warning('Could not record websocket auth stats', exc_info=True)
+
+
+metrics = AuthMetrics()
+
+
+def parse_query_string(scope):
+    """The connect URL's query parameters, first value of each"""
+    query_string = scope.get('query_string', b'').decode('latin-1')
+    return {key: values[0] for key, values in parse_qs(query_string).items()}
+
+
+def invalidate_user(user_id):
+    cache.delete(USER_GENERATION_KEY.format(user_id=user_id))
 
 
 @database_sync_to_async
-def get_user(token_key):
+def load_user(user_id, generation):
+    User = get_user_model()
+    row = User.objects.filter(id=user_id).values_list(
+        'id', 'username', 'is_active', 'is_staff', 'is_superuser'
+    ).first()
+    return UserSnapshot(*row, generation=generation) if row else None
+
+
+async def get_user(token_key):
+    """
+    Resolve an access token to a user, returning ``(user, outcome)``.
+
+    The signature and expiry are checked on every connect (no I/O). The user
+    is read from the cache, keyed by the token's jti until the token expires,
+    and only goes to the database on a miss or after the user was saved.
+    """
     try:
         access_token = AccessToken(token_key)
-        user_id = access_token['user_id']
-        User = get_user_model()
-        return User.objects.get(id=user_id)
-    except Exception as e:
-        print(f"JWT Auth Error: {e}")
-        return AnonymousUser()
+    except TokenError:
+        return AnonymousUser(), 'invalid'
+    user_id = access_token.get(api_settings.USER_ID_CLAIM)
+    jti = access_token.get(api_settings.JTI_CLAIM)
+    if user_id is None:
+        return AnonymousUser(), 'invalid'
+
+    auth_key = AUTH_CACHE_KEY.format(jti=jti)
+    generation_key = USER_GENERATION_KEY.format(user_id=user_id)
+    cached = await cache.aget_many([auth_key, generation_key]) if jti else {}
+    user, generation = cached.get(auth_key), cached.get(generation_key)
+    if user is not None and generation is not None and user.generation == generation:
+        outcome = 'hit'
+    else:
+        if generation is None:
+            # Claimed before the read, so a save during the read still invalidates it
+            generation = uuid.uuid4().hex
+            await cache.aset(generation_key, generation, timeout=None)
+        user = await load_user(user_id, generation)
+        if user is not None and jti:
+            timeout = max(int(access_token['exp'] - time.time()), 1)
+            await cache.aset(auth_key, user, timeout=timeout)
+        outcome = 'miss'
+
+    if user is None or not user.is_active:
+        return AnonymousUser(), 'inactive'
+    return user, outcome
+
 
 class JWTAuthMiddleware:
     def __init__(self, inner):
         self.inner = inner
 
     async def __call__(self, scope, receive, send):
-        query_string = scope.get('query_string', b'').decode()
-        query_params = dict(qp.split('=') for qp in query_string.split('&') if '=' in qp)
-        token = query_params.get('token')
+        token = parse_query_string(scope).get('token')
 
+        started = time.perf_counter()
         if token:
-            scope['user'] = await get_user(token)
+            scope['user'], outcome = await get_user(token)
         else:
-            scope['user'] = AnonymousUser()
+            scope['user'], outcome = AnonymousUser(), 'anonymous'
+        counts = metrics.record(outcome, time.perf_counter() - started)
+        if counts:
+            asyncio.get_running_loop().run_in_executor(None, metrics.flush, counts)
 
         return await self.inner(scope, receive, send)
 
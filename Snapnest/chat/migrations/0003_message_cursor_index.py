@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 02:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_alter_message_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'receiver', 'timestamp', 'id'], name='chat_messag_sender__c1c7a0_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 6.0 on 2026-10-18 03:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def populate_conversations(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+
+    pairs = {
+        tuple(sorted(pair))
+        for pair in Message.objects.order_by().values_list('sender_id', 'receiver_id').distinct()
+    }
+    for low, high in pairs:
+        conversation = Conversation.objects.create(user_low_id=low, user_high_id=high)
+        Message.objects.filter(
+            Q(sender_id=low, receiver_id=high) | Q(sender_id=high, receiver_id=low)
+        ).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_cursor_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('user_high', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('user_low', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chat.conversation'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('user_low', 'user_high'), name='chat_conversation_unique_pair'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.CheckConstraint(condition=models.Q(('user_low__lte', models.F('user_high'))), name='chat_conversation_sorted_pair'),
+        ),
+        migrations.RunPython(populate_conversations, migrations.RunPython.noop),
+    ]
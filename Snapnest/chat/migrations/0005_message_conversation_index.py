@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 03:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_conversation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='message',
+            name='chat_messag_sender__c1c7a0_idx',
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chat.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', '-timestamp', '-id'], name='chat_messag_convers_1a2406_idx'),
+        ),
+    ]
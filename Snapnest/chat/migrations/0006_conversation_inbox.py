@@ -0,0 +1,65 @@
+# Generated by Django 6.0 on 2026-10-18 03:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_inbox(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+
+    for conversation in Conversation.objects.all():
+        messages = Message.objects.filter(conversation=conversation)
+        last_message = messages.order_by('-timestamp', '-id').first()
+        unread = messages.filter(is_read=False)
+        Conversation.objects.filter(pk=conversation.pk).update(
+            last_message=last_message,
+            last_activity=last_message.timestamp if last_message else None,
+            unread_low=unread.filter(receiver_id=conversation.user_low_id).count(),
+            unread_high=unread.filter(receiver_id=conversation.user_high_id).count(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_message_conversation_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_activity',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='unread_high',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='unread_low',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user_low', '-last_activity', '-id'], name='chat_conver_user_lo_7c8941_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user_high', '-last_activity', '-id'], name='chat_conver_user_hi_62c230_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['conversation', 'receiver'], name='chat_message_unread_idx'),
+        ),
+        migrations.RunPython(populate_inbox, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_message_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='id',
+            field=models.BigAutoField(primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_message_bigint_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='conversation',
+            name='id',
+            field=models.BigAutoField(primary_key=True, serialize=False),
+        ),
+    ]
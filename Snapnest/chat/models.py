@@ -1,18 +1,94 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 # Create your models here.
 
+class Conversation(models.Model):
+    id=models.BigAutoField(primary_key=True)
+    # The pair is stored sorted, like the chat_{a}_{b} room names in ChatConsumer
+    user_low=models.ForeignKey(User,on_delete=models.CASCADE,related_name='+')
+    user_high=models.ForeignKey(User,on_delete=models.CASCADE,related_name='+')
+    created=models.DateTimeField(auto_now_add=True)
+    # Denormalized for the inbox; written with each message by chat.inbox.record_message
+    last_message=models.ForeignKey('Message',on_delete=models.SET_NULL,null=True,blank=True,related_name='+')
+    last_activity=models.DateTimeField(null=True,blank=True)
+    unread_low=models.PositiveIntegerField(default=0)
+    unread_high=models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes=[
+            # One per side of the pair; the inbox ORs them, newest activity first
+            models.Index(fields=['user_low', '-last_activity', '-id']),
+            models.Index(fields=['user_high', '-last_activity', '-id']),
+        ]
+        constraints=[
+            models.UniqueConstraint(fields=['user_low', 'user_high'], name='chat_conversation_unique_pair'),
+            models.CheckConstraint(
+                condition=models.Q(user_low__lte=models.F('user_high')),
+                name='chat_conversation_sorted_pair',
+            ),
+        ]
+
+    def __str__(self):
+        return self.room_name
+
+    @staticmethod
+    def pair(user_id, other_user_id):
+        return tuple(sorted((int(user_id), int(other_user_id))))
+
+    @classmethod
+    def room_name_for(cls, user_id, other_user_id):
+        low, high = cls.pair(user_id, other_user_id)
+        return f'chat_{low}_{high}'
+
+    @classmethod
+    def for_users(cls, user_id, other_user_id):
+        low, high = cls.pair(user_id, other_user_id)
+        conversation, _ = cls.objects.get_or_create(user_low_id=low, user_high_id=high)
+        return conversation
+
+    @property
+    def room_name(self):
+        return self.room_name_for(self.user_low_id, self.user_high_id)
+
+    def unread_field(self, user_id):
+        """The unread counter column belonging to ``user_id``'s side of the pair"""
+        return 'unread_low' if int(user_id) == self.user_low_id else 'unread_high'
+
+    def other_user(self, user_id):
+        return self.user_high if int(user_id) == self.user_low_id else self.user_low
+
+    def unread_count(self, user_id):
+        return getattr(self, self.unread_field(user_id))
+
+
 class Message(models.Model):
+    # Snowflake ids from chat.ids are 63-bit, so the column must stay a BIGINT
+    id=models.BigAutoField(primary_key=True)
+    conversation=models.ForeignKey(Conversation,on_delete=models.CASCADE,related_name='messages')
     sender=models.ForeignKey(User,on_delete=models.CASCADE,related_name='sent_messages')
     receiver=models.ForeignKey(User,on_delete=models.CASCADE,related_name='received_messages')
     content=models.TextField()
-    timestamp=models.DateTimeField(auto_now_add=True)
+    # Set when the message is built, so a broadcast can carry it before the insert
+    timestamp=models.DateTimeField(default=timezone.now)
     is_read=models.BooleanField(default=False)
 
     class Meta:
         ordering=['-timestamp']
+        indexes=[
+            # History is one range scan of a conversation, newest first
+            models.Index(fields=['conversation', '-timestamp', '-id']),
+            models.Index(
+                fields=['conversation', 'receiver'],
+                condition=models.Q(is_read=False),
+                name='chat_message_unread_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.sender} to {self.receiver}: {self.content[:30]}'
 
-        
\ No newline at end of file
+    def save(self,*args,**kwargs):
+        if self.conversation_id is None:
+            self.conversation=Conversation.for_users(self.sender_id, self.receiver_id)
+        super().save(*args,**kwargs)
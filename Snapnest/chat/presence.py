@@ -0,0 +1,170 @@
+import time
+
+from django.conf import settings
+from django.db.models import Q
+
+from account.models import Contact
+from .models import Conversation
+
+# Last heartbeat of every online user; entries older than PRESENCE_TTL are expired by sweep()
+HEARTBEATS_KEY = 'presence:heartbeats'
+# Open notification sockets per user, so closing one tab does not take the user offline
+SOCKETS_KEY = 'presence:sockets'
+# When each user was last online, kept after they go offline
+LAST_SEEN_KEY = 'presence:last_seen'
+# Sockets interested in a user's presence join this channel group
+PRESENCE_GROUP = 'presence_{user_id}'
+
+# Register a socket and its heartbeat; returns 1 if the user just came online.
+# A user with no fresh heartbeat has no live sockets, so any count left behind
+# (by a crashed worker) is reset rather than added to.
+# KEYS: heartbeats, sockets
+# ARGV: user id, now, cutoff
+CONNECT_LUA = """
+local previous = redis.call('ZSCORE', KEYS[1], ARGV[1])
+local online = previous and tonumber(previous) > tonumber(ARGV[3])
+if online then
+    redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+else
+    redis.call('HSET', KEYS[2], ARGV[1], 1)
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+if online then
+    return 0
+end
+return 1
+"""
+
+# Remove and return heartbeats older than the cutoff, recording when each user
+# was last seen. Atomic, so a heartbeat racing the sweep is never removed.
+# Socket counts are kept: sockets that only stalled resume heartbeating and
+# still need counting when they close.
+# KEYS: heartbeats, last seen
+# ARGV: cutoff, max users per sweep
+SWEEP_LUA = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+local gone = {}
+for i = 1, #expired, 2 do
+    redis.call('ZREM', KEYS[1], expired[i])
+    redis.call('HSET', KEYS[2], expired[i], expired[i + 1])
+    table.insert(gone, expired[i])
+end
+return gone
+"""
+SWEEP_BATCH_SIZE = 1000
+# Each web process sweeps at most this often, piggybacking on heartbeats
+SWEEP_INTERVAL = 5
+
+_connect_script = None
+_sweep_script = None
+_last_sweep = 0
+
+
+def presence_group(user_id):
+    return PRESENCE_GROUP.format(user_id=user_id)
+
+
+def _is_fresh(score, now):
+    return score is not None and float(score) > now - settings.PRESENCE_TTL
+
+
+def connect(redis_conn, user_id, now=None):
+    """Register an open socket and its first heartbeat; True if the user just came online"""
+    global _connect_script
+    if _connect_script is None:
+        _connect_script = redis_conn.register_script(CONNECT_LUA)
+    now = now or time.time()
+    came_online = _connect_script(
+        keys=[HEARTBEATS_KEY, SOCKETS_KEY], args=[user_id, now, now - settings.PRESENCE_TTL]
+    )
+    return bool(came_online)
+
+
+def heartbeat(redis_conn, user_id, now=None):
+    """Refresh the user's heartbeat; True if they had already expired"""
+    now = now or time.time()
+    pipe = redis_conn.pipeline()
+    pipe.zscore(HEARTBEATS_KEY, user_id)
+    pipe.zadd(HEARTBEATS_KEY, {user_id: now})
+    previous, _ = pipe.execute()
+    return not _is_fresh(previous, now)
+
+
+def disconnect(redis_conn, user_id, now=None):
+    """Close one socket; True if it was the user's last one and they went offline"""
+    now = now or time.time()
+    sockets = redis_conn.hincrby(SOCKETS_KEY, user_id, -1)
+    if sockets > 0:
+        return False
+    if sockets < 0:
+        # Reset by a connect while this socket had stalled, so others may still be
+        # open: clamp at zero and leave the heartbeat to expire
+        redis_conn.hdel(SOCKETS_KEY, user_id)
+        return False
+    pipe = redis_conn.pipeline()
+    pipe.hdel(SOCKETS_KEY, user_id)
+    pipe.zrem(HEARTBEATS_KEY, user_id)
+    pipe.hset(LAST_SEEN_KEY, user_id, now)
+    _, removed, _ = pipe.execute()
+    return bool(removed)
+
+
+def sweep(redis_conn, now=None):
+    """
+    Expire users whose sockets stopped heartbeating without disconnecting
+    (crashed workers, dropped networks). Returns their ids.
+    """
+    global _sweep_script
+    if _sweep_script is None:
+        _sweep_script = redis_conn.register_script(SWEEP_LUA)
+    now = now or time.time()
+    gone = _sweep_script(
+        keys=[HEARTBEATS_KEY, LAST_SEEN_KEY],
+        args=[now - settings.PRESENCE_TTL, SWEEP_BATCH_SIZE],
+    )
+    return [int(user_id) for user_id in gone]
+
+
+def sweep_if_due(redis_conn, now=None):
+    global _last_sweep
+    now = now or time.time()
+    if now - _last_sweep < SWEEP_INTERVAL:
+        return []
+    _last_sweep = now
+    return sweep(redis_conn, now)
+
+
+def statuses(redis_conn, user_ids, now=None):
+    """``{user_id: {'online': bool, 'last_seen': epoch seconds or None}}`` in one round trip"""
+    now = now or time.time()
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.zmscore(HEARTBEATS_KEY, user_ids)
+    pipe.hmget(LAST_SEEN_KEY, user_ids)
+    heartbeats, last_seen = pipe.execute()
+    result = {}
+    for user_id, beat, seen in zip(user_ids, heartbeats, last_seen):
+        online = _is_fresh(beat, now)
+        seen = beat if beat is not None else seen
+        result[user_id] = {'online': online, 'last_seen': float(seen) if seen is not None else None}
+    return result
+
+
+def interests(user_id):
+    """
+    Users whose presence ``user_id`` is shown: the people they follow and their
+    chat partners, most recent first, up to PRESENCE_MAX_INTERESTS.
+    """
+    limit = settings.PRESENCE_MAX_INTERESTS
+    partners = Conversation.objects.filter(
+        Q(user_low_id=user_id) | Q(user_high_id=user_id), last_activity__isnull=False
+    ).order_by('-last_activity').values_list('user_low_id', 'user_high_id')[:limit]
+    following = Contact.objects.filter(user_from_id=user_id).order_by('-created').values_list(
+        'user_to_id', flat=True
+    )[:limit]
+
+    ids = [low if high == user_id else high for low, high in partners]
+    ids += following
+    return list(dict.fromkeys(other_id for other_id in ids if other_id != user_id))[:limit]
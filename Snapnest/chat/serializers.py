@@ -1,10 +1,50 @@
 from rest_framework import serializers
-from .models import Message
+from django.contrib.auth import get_user_model
+from account.serializers import SimpleProfileSerializer
+from .models import Conversation, Message
+
+User = get_user_model()
 
 class MessageSerializer(serializers.ModelSerializer):
+    # Snowflake ids exceed JavaScript's 2**53 safe integers, so they go out as strings
+    id = serializers.CharField(read_only=True)
     sender_username = serializers.ReadOnlyField(source='sender.username')
     
     class Meta:
         model = Message
         fields = ['id', 'sender', 'sender_username', 'receiver', 'content', 'timestamp']
         read_only_fields = ['timestamp']
+
+
+class InboxUserSerializer(serializers.ModelSerializer):
+    profile = SimpleProfileSerializer(read_only=True)
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'profile']
+
+
+class LastMessageSerializer(serializers.ModelSerializer):
+    id = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Message
+        fields = ['id', 'sender', 'content', 'timestamp']
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    """An inbox row, from the viewer's side of the conversation"""
+    user = serializers.SerializerMethodField()
+    last_message = LastMessageSerializer(read_only=True)
+    unread_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Conversation
+        fields = ['id', 'user', 'last_message', 'last_activity', 'unread_count']
+
+    def get_user(self, obj):
+        other = obj.other_user(self.context['request'].user.id)
+        return InboxUserSerializer(other, context=self.context).data
+
+    def get_unread_count(self, obj):
+        return obj.unread_count(self.context['request'].user.id)
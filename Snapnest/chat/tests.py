@@ -1,3 +1,349 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from account.models import Contact
+from chat import presence
+from chat.consumers import ChatConsumer, NotificationConsumer
+from chat import writer
+from chat.ids import SnowflakeGenerator, next_message_id
+from chat.inbox import record_message, record_messages
+from chat.middleware import AUTH_CACHE_KEY, AuthMetrics, get_user, parse_query_string
+from chat.models import Conversation, Message
+from Snapnest.redis_client import get_redis_connection
+
+User = get_user_model()
+
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.create_user(username='alice', password='password123')
+        self.bob = User.objects.create_user(username='bob', password='password123')
+        self.client.force_authenticate(user=self.alice)
+
+    def test_conversation_pair_is_canonical(self):
+        conversation = Conversation.for_users(self.bob.id, self.alice.id)
+        self.assertEqual(Conversation.for_users(self.alice.id, self.bob.id), conversation)
+        self.assertEqual((conversation.user_low, conversation.user_high), (self.alice, self.bob))
+        self.assertEqual(conversation.room_name, f'chat_{self.alice.id}_{self.bob.id}')
+
+        message = Message.objects.create(sender=self.bob, receiver=self.alice, content='hi')
+        self.assertEqual(message.conversation, conversation)
+
+    def test_history_is_newest_first_by_cursor(self):
+        for i in range(25):
+            sender, receiver = (self.alice, self.bob) if i % 2 else (self.bob, self.alice)
+            Message.objects.create(sender=sender, receiver=receiver, content=str(i))
+        carol = User.objects.create_user(username='carol', password='password123')
+        Message.objects.create(sender=carol, receiver=self.alice, content='elsewhere')
+
+        response = self.client.get(f'/api/messages/{self.bob.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        contents = [m['content'] for m in response.data['results']]
+        self.assertEqual(contents, [str(i) for i in range(24, 4, -1)])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([m['content'] for m in response.data['results']], ['4', '3', '2', '1', '0'])
+        self.assertIsNone(response.data['next'])
+
+    def test_history_without_conversation_is_empty(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/messages/{self.bob.id}/')
+        self.assertEqual(response.data['results'], [])
+        self.assertFalse(Conversation.objects.exists())
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.create_user(username='alice', password='password123')
+        self.bob = User.objects.create_user(username='bob', password='password123')
+        self.carol = User.objects.create_user(username='carol', password='password123')
+        self.client.force_authenticate(user=self.alice)
+
+    def send(self, sender, receiver, content):
+        conversation = Conversation.for_users(sender.id, receiver.id)
+        return record_message(conversation, sender, receiver.id, content)
+
+    def inbox(self):
+        response = self.client.get('/api/inbox/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_inbox_lists_latest_message_and_unread_counts(self):
+        self.send(self.bob, self.alice, 'hi')
+        self.send(self.bob, self.alice, 'are you there?')
+        self.send(self.alice, self.carol, 'lunch?')
+        last = self.send(self.carol, self.alice, 'sure')
+
+        with self.assertNumQueries(1):
+            rows = self.inbox()
+        self.assertEqual([row['user']['username'] for row in rows], ['carol', 'bob'])
+        self.assertEqual(rows[0]['last_message']['id'], str(last.id))
+        self.assertEqual([row['unread_count'] for row in rows], [1, 2])
+
+        # The other side of the pair keeps its own count
+        self.client.force_authenticate(user=self.carol)
+        self.assertEqual(self.inbox()[0]['unread_count'], 1)
+
+    def test_mark_read_clears_unread(self):
+        self.send(self.bob, self.alice, 'hi')
+        self.send(self.alice, self.bob, 'hello')
+        response = self.client.post(f'/api/messages/{self.bob.id}/read/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.inbox()[0]['unread_count'], 0)
+        self.assertFalse(Message.objects.filter(receiver=self.alice, is_read=False).exists())
+        # Bob has not read Alice's reply
+        self.assertTrue(Message.objects.filter(receiver=self.bob, is_read=False).exists())
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CHAT_WRITE_BATCH_SIZE=2,
+    CHAT_WRITE_BATCH_DELAY_MS=10,
+)
+class MessageWriterTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='password123')
+        self.bob = User.objects.create_user(username='bob', password='password123')
+
+    def connect(self):
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f'/ws/chat/{self.bob.id}/')
+        communicator.scope['user'] = self.alice
+        communicator.scope['url_route'] = {'kwargs': {'user_id': str(self.bob.id)}}
+        return communicator
+
+    async def chat(self, *contents):
+        communicator = self.connect()
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        received = []
+        for i, content in enumerate(contents):
+            await communicator.send_json_to({'type': 'chat_message', 'message': content, 'client_id': i})
+        def count(event_type):
+            return len([event for event in received if event['type'] == event_type])
+
+        while count('message_ack') < len(contents) or count('chat_message') < len(contents):
+            received.append(await communicator.receive_json_from(timeout=5))
+        await communicator.disconnect()
+        return received
+
+    def test_messages_are_broadcast_then_group_committed(self):
+        received = async_to_sync(self.chat)('one', 'two', 'three')
+
+        broadcasts = [event for event in received if event['type'] == 'chat_message']
+        acks = [event for event in received if event['type'] == 'message_ack']
+        self.assertEqual([event['message'] for event in broadcasts], ['one', 'two', 'three'])
+        self.assertEqual(sorted(ack['client_id'] for ack in acks), [0, 1, 2])
+        self.assertEqual({ack['id'] for ack in acks}, {event['id'] for event in broadcasts})
+
+        # Stored under the broadcast ids, with the inbox updated in the same batches
+        messages = list(Message.objects.order_by('id'))
+        # Sent as strings, since they are past JavaScript's safe integers
+        self.assertEqual([str(m.id) for m in messages], [event['id'] for event in broadcasts])
+        self.assertGreater(messages[0].id, 2 ** 53)
+        self.assertEqual([m.content for m in messages], ['one', 'two', 'three'])
+        conversation = Conversation.for_users(self.alice.id, self.bob.id)
+        self.assertEqual(str(conversation.last_message_id), broadcasts[-1]['id'])
+        self.assertEqual(conversation.unread_count(self.bob.id), 3)
+
+    @override_settings(CHAT_DURABLE_BROADCAST=True)
+    def test_durable_broadcast_waits_for_commit(self):
+        received = async_to_sync(self.chat)('hello')
+        # Acknowledged before anyone sees it
+        self.assertEqual([event['type'] for event in received[-2:]], ['message_ack', 'chat_message'])
+        self.assertTrue(Message.objects.filter(id=received[-1]['id']).exists())
+
+    def test_bad_message_fails_without_its_batch(self):
+        conversation = Conversation.for_users(self.alice.id, self.bob.id)
+        messages = [
+            Message(
+                id=next_message_id(), conversation=conversation, sender_id=self.alice.id,
+                receiver_id=self.bob.id, content=content,
+            )
+            for content in ('one', 'bad', 'three')
+        ]
+
+        def record(batch):
+            if any(message.content == 'bad' for message in batch):
+                raise IntegrityError('rejected row')
+            return record_messages(batch)
+
+        async def write():
+            message_writer = writer.MessageWriter(batch_size=3, delay=1)
+            futures = [message_writer.submit(message) for message in messages]
+            return await asyncio.gather(*futures, return_exceptions=True)
+
+        with mock.patch('chat.writer.record_messages', side_effect=record), self.assertLogs('chat.writer'):
+            results = async_to_sync(write)()
+        self.assertEqual([isinstance(result, IntegrityError) for result in results], [False, True, False])
+        self.assertEqual(list(Message.objects.order_by('id').values_list('content', flat=True)), ['one', 'three'])
+
+    def test_unstorable_content_is_rejected(self):
+        async def send(*contents):
+            communicator = self.connect()
+            await communicator.connect()
+            for i, content in enumerate(contents):
+                await communicator.send_json_to({'type': 'chat_message', 'message': content, 'client_id': i})
+            failed = []
+            while len(failed) < len(contents):
+                event = await communicator.receive_json_from(timeout=5)
+                self.assertNotEqual(event['type'], 'chat_message')
+                if event['type'] == 'message_failed':
+                    failed.append(event['client_id'])
+            await communicator.disconnect()
+            return failed
+
+        self.assertEqual(async_to_sync(send)('nul\x00byte', '  '), [0, 1])
+        self.assertFalse(Message.objects.exists())
+
+    def test_snowflake_ids_are_unique_and_ordered(self):
+        generator = SnowflakeGenerator(worker_id=3)
+        ids = [generator.next_id() for _ in range(10000)]
+        self.assertEqual(ids, sorted(set(ids)))
+
+
+class WebsocketAuthTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='password123')
+        self.token = AccessToken.for_user(self.user)
+        cache.delete(AUTH_CACHE_KEY.format(jti=self.token['jti']))
+
+    def authenticate(self, token=None):
+        return async_to_sync(get_user)(str(token or self.token))
+
+    def test_connects_are_served_from_the_cache(self):
+        with self.assertNumQueries(1):
+            user, outcome = self.authenticate()
+        self.assertEqual((user.id, user.username, outcome), (self.user.id, 'alice', 'miss'))
+        self.assertTrue(user.is_authenticated)
+
+        with self.assertNumQueries(0):
+            user, outcome = self.authenticate()
+        self.assertEqual((user.username, outcome), ('alice', 'hit'))
+
+        # Saving the user invalidates every cached token of theirs
+        self.user.username = 'alicia'
+        self.user.save()
+        user, outcome = self.authenticate()
+        self.assertEqual((user.username, outcome), ('alicia', 'miss'))
+
+        self.user.is_active = False
+        self.user.save()
+        user, outcome = self.authenticate()
+        self.assertFalse(user.is_authenticated)
+        self.assertEqual(outcome, 'inactive')
+
+    def test_invalid_tokens_are_anonymous(self):
+        user, outcome = self.authenticate('not-a-token')
+        self.assertFalse(user.is_authenticated)
+        self.assertEqual(outcome, 'invalid')
+
+    def test_query_string_parsing(self):
+        scope = {'query_string': b'token=abc.def%3D%3D&other=1&token=ignored&flag'}
+        self.assertEqual(parse_query_string(scope), {'token': 'abc.def==', 'other': '1'})
+        self.assertEqual(parse_query_string({'query_string': b'token=a=b'}), {'token': 'a=b'})
+        self.assertEqual(parse_query_string({}), {})
+
+    def test_metrics_bucket_latency(self):
+        metrics = AuthMetrics()
+        metrics.record('hit', 0.0005)
+        metrics.record('miss', 0.02)
+        self.assertEqual(
+            {field: count for field, count in metrics.counts.items() if field != 'latency_ms_total'},
+            {'hit': 1, 'miss': 1, 'le_1ms': 1, 'le_25ms': 1},
+        )
+
+
+def clear_presence():
+    get_redis_connection().delete(presence.HEARTBEATS_KEY, presence.SOCKETS_KEY, presence.LAST_SEEN_KEY)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class PresenceTests(TestCase):
+    def setUp(self):
+        clear_presence()
+        self.r = get_redis_connection()
+        self.client = APIClient()
+        self.alice = User.objects.create_user(username='alice', password='password123')
+        self.bob = User.objects.create_user(username='bob', password='password123')
+        self.client.force_authenticate(user=self.bob)
+
+    def tearDown(self):
+        clear_presence()
+
+    def test_heartbeats_expire(self):
+        self.assertTrue(presence.connect(self.r, self.alice.id, now=1000))
+        # A second tab neither announces nor, when closed, ends the session
+        self.assertFalse(presence.connect(self.r, self.alice.id, now=1001))
+        self.assertFalse(presence.disconnect(self.r, self.alice.id, now=1002))
+        self.assertTrue(presence.statuses(self.r, [self.alice.id], now=1030)[self.alice.id]['online'])
+
+        # The remaining socket died without disconnecting
+        self.assertEqual(presence.sweep(self.r, now=1030), [])
+        self.assertEqual(presence.sweep(self.r, now=1100), [self.alice.id])
+        status = presence.statuses(self.r, [self.alice.id], now=1100)[self.alice.id]
+        self.assertEqual(status, {'online': False, 'last_seen': 1001.0})
+        self.assertTrue(presence.heartbeat(self.r, self.alice.id, now=1200))
+
+    def test_sweep_keeps_counting_stalled_sockets(self):
+        presence.connect(self.r, self.alice.id, now=1000)
+        presence.connect(self.r, self.alice.id, now=1000)
+        # Both tabs stalled long enough to be swept, then resumed
+        self.assertEqual(presence.sweep(self.r, now=1100), [self.alice.id])
+        self.assertTrue(presence.heartbeat(self.r, self.alice.id, now=1101))
+        self.assertFalse(presence.disconnect(self.r, self.alice.id, now=1102))
+        self.assertTrue(presence.statuses(self.r, [self.alice.id], now=1103)[self.alice.id]['online'])
+        self.assertTrue(presence.disconnect(self.r, self.alice.id, now=1104))
+
+        # Counts left by a crashed worker are reset once the user is offline
+        self.r.hset(presence.SOCKETS_KEY, self.alice.id, 5)
+        self.assertTrue(presence.connect(self.r, self.alice.id, now=1200))
+        self.assertTrue(presence.disconnect(self.r, self.alice.id, now=1201))
+        # A close with no count left is clamped instead of ending the session
+        self.assertFalse(presence.disconnect(self.r, self.alice.id, now=1202))
+        self.assertFalse(self.r.hexists(presence.SOCKETS_KEY, self.alice.id))
+
+    def test_bulk_presence_endpoint(self):
+        presence.connect(self.r, self.alice.id)
+        response = self.client.get('/api/presence/', {'ids': f'{self.alice.id},{self.bob.id}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data[str(self.alice.id)]['online'])
+        self.assertEqual(response.data[str(self.bob.id)], {'online': False, 'last_seen': None})
+
+        response = self.client.get('/api/presence/', {'ids': 'a,b'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notify/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def watch_alice(self):
+        bob = await self.connect(self.bob)
+        alice = await self.connect(self.alice)
+        online = await bob.receive_json_from(timeout=5)
+        await alice.disconnect()
+        offline = await bob.receive_json_from(timeout=5)
+        self.assertTrue(await bob.receive_nothing())
+        await bob.disconnect()
+        return online, offline
+
+    def test_followers_are_told_when_a_user_comes_and_goes(self):
+        Contact.objects.create(user_from=self.bob, user_to=self.alice)
+        online, offline = async_to_sync(self.watch_alice)()
+        self.assertEqual(online, {'type': 'presence', 'user_id': self.alice.id, 'status': 'online'})
+        self.assertEqual(offline, {'type': 'presence', 'user_id': self.alice.id, 'status': 'offline'})
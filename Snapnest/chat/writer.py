@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import weakref
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+
+from .inbox import record_messages
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    """
+    Group-commits chat messages from every consumer on an event loop.
+
+    Messages already carry their id and timestamp, so callers can broadcast
+    before they are written. A batch is flushed when it reaches
+    CHAT_WRITE_BATCH_SIZE or CHAT_WRITE_BATCH_DELAY_MS after its first message,
+    as one ``bulk_create`` plus the inbox updates in a single transaction. If
+    that fails, the batch is retried one message at a time so only the bad
+    message fails.
+
+    Messages still waiting for their batch are lost if the process stops.
+    """
+
+    def __init__(self, batch_size, delay):
+        self.batch_size = batch_size
+        self.delay = delay
+        self.pending = []
+        self.timer = None
+        # Keeps running flushes alive until they finish
+        self.flushes = set()
+
+    def submit(self, message):
+        """Queue ``message``; the returned future resolves once it is committed"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((message, future))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.delay, self.flush)
+        return future
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = asyncio.ensure_future(self._write(batch))
+            self.flushes.add(task)
+            task.add_done_callback(self.flushes.discard)
+
+    async def _write(self, batch):
+        messages = [message for message, _ in batch]
+        try:
+            # database_sync_to_async runs on one thread, so batches commit in order
+            await database_sync_to_async(record_messages)(messages)
+            errors = [None] * len(batch)
+        except Exception:
+            logger.warning('Failed to write %d chat messages, retrying one by one', len(batch), exc_info=True)
+            errors = await database_sync_to_async(record_each)(messages)
+        for (message, future), error in zip(batch, errors):
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(message)
+            else:
+                future.set_exception(error)
+
+
+def record_each(messages):
+    """Write each message in its own transaction, returning its error or None"""
+    errors = []
+    for message in messages:
+        try:
+            record_messages([message])
+        except Exception as e:
+            logger.exception('Failed to write chat message %s', message.id)
+            errors.append(e)
+        else:
+            errors.append(None)
+    return errors
+
+
+_writers = weakref.WeakKeyDictionary()
+
+
+def get_writer():
+    """The writer for the running event loop"""
+    loop = asyncio.get_running_loop()
+    writer = _writers.get(loop)
+    if writer is None:
+        writer = _writers[loop] = MessageWriter(
+            settings.CHAT_WRITE_BATCH_SIZE, settings.CHAT_WRITE_BATCH_DELAY_MS / 1000
+        )
+    return writer
@@ -0,0 +1,213 @@
+import hashlib
+import time
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Image
+from .ranking import HOURLY_TTL, RANKING_KEY, hourly_key
+
+VIEWS_KEY = 'image:{image_id}:views'
+# HyperLogLog of distinct viewers; capped at ~12KB per image however many views it gets
+VIEWERS_KEY = 'image:{image_id}:viewers'
+# Images with views not yet written to Image.total_views, scored by when they first became dirty
+DIRTY_KEY = 'image_views:dirty'
+# A dirty set handed off to a flusher; left behind if the flusher dies and picked up by the next run
+FLUSHING_KEY = 'image_views:flushing'
+FLUSH_STATS_KEY = 'image_views:flush_stats'
+
+# One round trip per view: seed the counter from the DB value if it is missing,
+# increment it, record the viewer, mark the image dirty and bump the all-time
+# and hourly rankings. In unique mode the rankings only move for a new viewer.
+# KEYS: views counter, viewers HLL, dirty set, all-time ranking, hourly bucket
+# ARGV: DB total_views, now, hourly bucket TTL, image id, viewer id ('' if unknown), unique mode ('1'/'0')
+INCREMENT_VIEWS_LUA = """
+redis.call('SET', KEYS[1], ARGV[1], 'NX')
+local total = redis.call('INCR', KEYS[1])
+local new_viewer = 1
+if ARGV[5] ~= '' then
+    new_viewer = redis.call('PFADD', KEYS[2], ARGV[5])
+end
+redis.call('ZADD', KEYS[3], 'NX', ARGV[2], ARGV[4])
+if ARGV[6] == '0' or new_viewer == 1 then
+    redis.call('ZINCRBY', KEYS[4], 1, ARGV[4])
+    redis.call('ZINCRBY', KEYS[5], 1, ARGV[4])
+    redis.call('EXPIRE', KEYS[5], ARGV[3])
+end
+return {total, redis.call('PFCOUNT', KEYS[2])}
+"""
+
+_increment_views_script = None
+
+
+def views_key(image_id):
+    return VIEWS_KEY.format(image_id=image_id)
+
+
+def viewers_key(image_id):
+    return VIEWERS_KEY.format(image_id=image_id)
+
+
+def viewer_fingerprint(request):
+    """Identify a viewer by user id, or by a hash of IP and user agent when anonymous"""
+    if request.user.is_authenticated:
+        return f'u:{request.user.id}'
+    ip = client_ip(request)
+    agent = request.META.get('HTTP_USER_AGENT', '')
+    return 'a:' + hashlib.sha1(f'{ip}|{agent}'.encode()).hexdigest()
+
+
+def client_ip(request):
+    """
+    The address our outermost proxy saw, TRUSTED_PROXY_COUNT entries from the
+    right of X-Forwarded-For. Entries left of it come from the client, which
+    can send any header it likes.
+    """
+    hops = settings.TRUSTED_PROXY_COUNT
+    forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+    if hops and len(forwarded) >= hops:
+        return forwarded[-hops]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def get_increment_views_script(redis_conn):
+    """Register the increment script once; redis-py then calls it by SHA"""
+    global _increment_views_script
+    if _increment_views_script is None:
+        _increment_views_script = redis_conn.register_script(INCREMENT_VIEWS_LUA)
+    return _increment_views_script
+
+
+def increment_views(redis_conn, image, viewer=None):
+    """
+    Count one view of ``image`` in Redis and mark it dirty for the flusher.
+
+    Shared by the API and template views. Everything happens atomically in a
+    single script call, and nothing is written to the database here;
+    ``flush_views`` copies the counters into Image.total_views in bulk.
+
+    ``viewer`` (see ``viewer_fingerprint``) feeds the unique-viewer count; with
+    IMAGE_VIEWS_UNIQUE_RANKING on, repeat views from the same viewer still count
+    as raw views but no longer move the rankings.
+
+    Returns ``(total_views, unique_views)``.
+    """
+    script = get_increment_views_script(redis_conn)
+    total_views, unique_views = script(
+        keys=[
+            views_key(image.id),
+            viewers_key(image.id),
+            DIRTY_KEY,
+            RANKING_KEY,
+            hourly_key(timezone.now()),
+        ],
+        args=[
+            image.total_views,
+            time.time(),
+            HOURLY_TTL,
+            image.id,
+            viewer or '',
+            '1' if settings.IMAGE_VIEWS_UNIQUE_RANKING else '0',
+        ],
+        client=redis_conn,
+    )
+    return int(total_views), int(unique_views)
+
+
+def attach_view_counts(redis_conn, images):
+    """Fetch raw and unique view counts for ``images`` in one round trip for the serializer"""
+    images = list(images)
+    if not images:
+        return
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.mget([views_key(img.id) for img in images])
+    for img in images:
+        pipe.pfcount(viewers_key(img.id))
+    results = pipe.execute()
+    for img, count, unique in zip(images, results[0], results[1:]):
+        img._redis_views = int(count) if count else img.total_views
+        img._redis_unique_views = int(unique)
+
+
+def flush_lag(redis_conn):
+    """Seconds since the oldest unflushed view, or 0 when everything is flushed"""
+    oldest = []
+    for key in (FLUSHING_KEY, DIRTY_KEY):
+        oldest.extend(redis_conn.zrange(key, 0, 0, withscores=True))
+    if not oldest:
+        return 0
+    return max(time.time() - min(score for member, score in oldest), 0)
+
+
+def _handoff(redis_conn):
+    """Move the dirty set aside so new views start a fresh one while we flush"""
+    if redis_conn.exists(FLUSHING_KEY):
+        # A previous flusher died half way; finish its work first
+        return True
+    try:
+        redis_conn.rename(DIRTY_KEY, FLUSHING_KEY)
+    except redis.ResponseError:
+        # RENAME fails when there is nothing dirty
+        return False
+    return True
+
+
+def _flush_batch(redis_conn, image_ids):
+    """Write the Redis counters for ``image_ids`` to the DB with a single UPDATE"""
+    counts = redis_conn.mget([views_key(image_id) for image_id in image_ids])
+    totals = {
+        image_id: int(count)
+        for image_id, count in zip(image_ids, counts)
+        if count is not None
+    }
+    if totals:
+        # Greatest() keeps the flush idempotent, so replaying a batch after a crash is harmless
+        Image.objects.filter(id__in=totals).update(
+            total_views=Greatest(
+                F('total_views'),
+                Case(
+                    *[When(id=image_id, then=Value(total)) for image_id, total in totals.items()],
+                    default=F('total_views'),
+                    output_field=PositiveIntegerField(),
+                ),
+            )
+        )
+    return len(totals)
+
+
+def flush_views(redis_conn, batch_size=None):
+    """
+    Copy dirty view counters from Redis into Image.total_views.
+
+    The dirty set is renamed to a flushing set before any DB work, so views
+    arriving mid-flush are never lost. Each batch is removed from the flushing
+    set only after its UPDATE commits; if the process dies in between, the next
+    run replays the batch, which is safe because counters are absolute.
+
+    Returns ``(images_flushed, lag_seconds)`` where the lag is the age of the
+    oldest view that this flush picked up.
+    """
+    batch_size = batch_size or settings.IMAGE_VIEWS_FLUSH_BATCH_SIZE
+    lag = flush_lag(redis_conn)
+    flushed = 0
+
+    if _handoff(redis_conn):
+        while True:
+            batch = redis_conn.zrange(FLUSHING_KEY, 0, batch_size - 1)
+            if not batch:
+                break
+            image_ids = [int(member) for member in batch]
+            with transaction.atomic():
+                flushed += _flush_batch(redis_conn, image_ids)
+            redis_conn.zrem(FLUSHING_KEY, *batch)
+
+    redis_conn.hset(FLUSH_STATS_KEY, mapping={
+        'flushed_at': time.time(),
+        'images': flushed,
+        'lag_seconds': round(lag, 3),
+    })
+    return flushed, lag
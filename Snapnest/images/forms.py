@@ -1,8 +1,6 @@
 from django import forms
 from .models import Image, Comment
-import requests
-from django.core.files.base import ContentFile
-from django.utils.text import slugify
+from .processing import BookmarkError, validate_remote_url
 
 
 class ImageCreateForm(forms.ModelForm):
@@ -21,23 +19,11 @@ class ImageCreateForm(forms.ModelForm):
             raise forms.ValidationError(
                 'The given URL does not match valid image extensions.'
             )
+        try:
+            validate_remote_url(url)
+        except BookmarkError as e:
+            raise forms.ValidationError(str(e))
         return url
-    
-    def save(self,force_insert=False,force_update=False,commit=True):
-        image=super().save(commit=False)
-        image_url=self.cleaned_data['url']
-        name=slugify(image.title)
-        extension=image_url.rsplit('.',1)[1].lower()
-        image_name=f'{name}.{extension}'
-        response=requests.get(image_url)
-        image.image.save(
-            image_name,
-            ContentFile(response.content),
-            save=False
-        )
-        if commit:
-            image.save()
-        return image
 
 
 class ImageUploadForm(forms.ModelForm):
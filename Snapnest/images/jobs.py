@@ -0,0 +1,65 @@
+import logging
+
+from django.core.files import File
+from django.utils.text import slugify
+
+from actions.jobs import notify_user, queue_action
+from .models import Image
+from .processing import BookmarkError, fetch_image, optimize_image
+from .renditions import generate_renditions
+
+logger = logging.getLogger(__name__)
+
+
+def reconcile_total_likes(image_id):
+    """Recount an image's likes from the m2m table; update() does not re-fire signals"""
+    image = Image.objects.filter(id=image_id)
+    image.update(total_likes=Image.users_like.through.objects.filter(image_id=image_id).count())
+
+
+def generate_image_renditions(image_id):
+    """Render the responsive widths and placeholder for a freshly uploaded image"""
+    image = Image.objects.filter(id=image_id).first()
+    if image is not None:
+        generate_renditions(image)
+
+
+def process_bookmark(image_id, verb='bookmarked image'):
+    """
+    Download and optimize a bookmarked image, then mark it ready (or failed)
+    and tell the owner over their notification socket.
+    """
+    image = Image.objects.select_related('user').filter(
+        id=image_id, status=Image.Status.PROCESSING
+    ).first()
+    if image is None:
+        # Deleted, or already processed by an earlier delivery
+        return
+
+    try:
+        with fetch_image(image.url) as source:
+            optimized = optimize_image(source)
+    except BookmarkError as e:
+        image.status = Image.Status.FAILED
+        image.processing_error = str(e)[:255]
+    except Exception:
+        logger.exception('Bookmark %s failed', image_id)
+        image.status = Image.Status.FAILED
+        image.processing_error = 'Failed to bookmark image. Please try again or use a different image URL.'
+    else:
+        # Streamed to storage in chunks from the spooled file
+        with optimized:
+            image.image.save(f'{slugify(image.title) or "image"}.jpg', File(optimized), save=False)
+        image.status = Image.Status.READY
+        image.processing_error = ''
+    image.save(update_fields=['image', 'status', 'processing_error'])
+
+    if image.status == Image.Status.READY:
+        generate_renditions(image)
+        queue_action(image.user, verb, image)
+    notify_user(image.user_id, {
+        'type': 'image_processed',
+        'uuid': str(image.uuid),
+        'status': image.status,
+        'error': image.processing_error,
+    })
@@ -0,0 +1,54 @@
+from django.db import connection, transaction
+
+from .models import Image
+
+Like = Image.users_like.through
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _adjust_total_likes(cursor, image_id, amount):
+    """Apply ``amount`` to total_likes in place (never below zero) and return the new value"""
+    cursor.execute(
+        f'UPDATE {_table(Image)} '
+        'SET total_likes = CASE WHEN total_likes + %s < 0 THEN 0 ELSE total_likes + %s END '
+        'WHERE id = %s RETURNING total_likes',
+        [amount, amount, image_id],
+    )
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def like(image, user):
+    """
+    Add ``user``'s like to ``image``.
+
+    The like row is written with INSERT ... ON CONFLICT DO NOTHING, so a repeat
+    like changes nothing, and only a real insert bumps total_likes by one.
+    Raw SQL skips the m2m_changed recount. Returns ``(created, total_likes)``.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {_table(Like)} (image_id, user_id) VALUES (%s, %s) '
+            'ON CONFLICT (image_id, user_id) DO NOTHING RETURNING id',
+            [image.id, user.id],
+        )
+        if cursor.fetchone() is None:
+            return False, image.total_likes
+        image.total_likes = _adjust_total_likes(cursor, image.id, 1)
+    return True, image.total_likes
+
+
+def unlike(image, user):
+    """Remove ``user``'s like from ``image``; returns ``(deleted, total_likes)``"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {_table(Like)} WHERE image_id = %s AND user_id = %s RETURNING id',
+            [image.id, user.id],
+        )
+        if cursor.fetchone() is None:
+            return False, image.total_likes
+        image.total_likes = _adjust_total_likes(cursor, image.id, -1)
+    return True, image.total_likes
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from images.api_views import r
+from images.counters import flush_views
+
+
+class Command(BaseCommand):
+    help = 'Write buffered image view counts from Redis to Image.total_views'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=settings.IMAGE_VIEWS_FLUSH_INTERVAL,
+            help='Seconds between flushes when running as a worker',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.IMAGE_VIEWS_FLUSH_BATCH_SIZE,
+            help='Images written per UPDATE statement',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Flush once and exit (for cron) instead of looping',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            flushed, lag = flush_views(r, batch_size=options['batch_size'])
+            self.stdout.write(f'Flushed views for {flushed} images (lag {lag:.1f}s)')
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from images.models import Image
+from images.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive renditions and placeholders for images that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regenerate every image, e.g. after changing THUMBNAIL_ALIASES',
+        )
+
+    def handle(self, *args, **options):
+        images = Image.objects.filter(status=Image.Status.READY).exclude(image='')
+        if not options['all']:
+            images = images.filter(placeholder='')
+        generated = 0
+        for image in images.iterator():
+            generate_renditions(image)
+            generated += 1
+        self.stdout.write(f'Generated renditions for {generated} images')
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 02:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0008_image_total_views'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['-created', '-id'], name='images_imag_created_2f5292_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 02:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0009_image_created_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='processing_error',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='status',
+            field=models.CharField(choices=[('ready', 'Ready'), ('processing', 'Processing'), ('failed', 'Failed')], default='ready', max_length=10),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0010_image_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='placeholder',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='renditions',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
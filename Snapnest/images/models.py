@@ -7,6 +7,12 @@ import uuid
 
 # Create your models here.
 class Image(models.Model):
+    class Status(models.TextChoices):
+        READY='ready','Ready'
+        # URL bookmarks are fetched and optimized by the job worker (images.jobs.process_bookmark)
+        PROCESSING='processing','Processing'
+        FAILED='failed','Failed'
+
     user=models.ForeignKey(
         settings.AUTH_USER_MODEL,
         related_name='images_created',
@@ -23,6 +29,11 @@ class Image(models.Model):
     image=models.ImageField(upload_to='images/%Y/%m/%d/', blank=True, null=True)
     description=models.TextField(blank=True)
     created=models.DateTimeField(auto_now_add=True)
+    status=models.CharField(max_length=10,choices=Status.choices,default=Status.READY)
+    processing_error=models.CharField(max_length=255,blank=True)
+    # Fixed-width renditions ({width: storage name}) and an inline LQIP, see images.renditions
+    renditions=models.JSONField(default=dict,blank=True)
+    placeholder=models.TextField(blank=True)
 
     users_like=models.ManyToManyField(
         settings.AUTH_USER_MODEL,
@@ -34,6 +45,7 @@ class Image(models.Model):
         indexes=[
             models.Index(fields=['created']),
             models.Index(fields=['-total_likes']),
+            models.Index(fields=['-created', '-id']),
         ]
         ordering=['-created']
     
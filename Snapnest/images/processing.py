@@ -0,0 +1,158 @@
+import ipaddress
+from tempfile import SpooledTemporaryFile
+from urllib.parse import urlparse
+
+import requests
+from PIL import Image as PILImage
+
+MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB limit
+CHUNK_SIZE = 8192  # 8KB chunks
+MAX_DIMENSION = 2048  # Longest side of a stored bookmark
+# Downloads and encoded output stay in memory up to this size, then spill to a temp file
+SPOOL_MAX_MEMORY = 1024 * 1024
+# Largest source accepted, checked from the header before any pixels are decoded.
+# 8K (7680x4320) fits.
+MAX_PIXELS = 40_000_000
+# Longest source side accepted. draft() downscales by at most 8x, so this keeps a
+# decoded JPEG within 2 * MAX_DIMENSION even for long panoramas.
+MAX_SIDE = 16 * MAX_DIMENSION
+USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+)
+
+
+class BookmarkError(Exception):
+    """A bookmark that cannot be processed; the message is shown to the user"""
+
+
+def validate_remote_url(image_url):
+    """SSRF mitigation: only allow public HTTP(S) URLs"""
+    try:
+        parsed_url = urlparse(image_url)
+    except ValueError as e:
+        raise BookmarkError(f'Invalid URL: {e}')
+    if parsed_url.scheme not in ['http', 'https']:
+        raise BookmarkError('Only HTTP and HTTPS URLs are allowed.')
+
+    # Check for internal/private IP ranges
+    hostname = parsed_url.hostname
+    if not hostname:
+        raise BookmarkError('Invalid URL.')
+    try:
+        ip = ipaddress.ip_address(hostname)
+        if ip.is_private or ip.is_loopback or ip.is_link_local:
+            raise BookmarkError('Internal or private URLs are not allowed.')
+    except ValueError:
+        # Hostname is not an IP, it's a domain name.
+        if hostname.lower() in ['localhost', '127.0.0.1', '::1', '0.0.0.0']:
+            raise BookmarkError('Internal or private URLs are not allowed.')
+
+
+def fetch_image(image_url):
+    """
+    Stream the remote image into a temporary file, enforcing the content type
+    and MAX_FILE_SIZE. The caller closes the returned file.
+    """
+    validate_remote_url(image_url)
+    source = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    try:
+        response = requests.get(
+            image_url,
+            headers={'User-Agent': USER_AGENT, 'Accept': 'image/*'},
+            timeout=(5, 30),  # (connect timeout, read timeout)
+            allow_redirects=True,
+            stream=True,
+        )
+        response.raise_for_status()
+
+        content_type = response.headers.get('content-type', '').lower()
+        if 'image/' not in content_type:
+            raise BookmarkError('URL does not point to a valid image.')
+
+        downloaded = 0
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if chunk:
+                downloaded += len(chunk)
+                if downloaded > MAX_FILE_SIZE:
+                    raise BookmarkError('Image is too large. Maximum size is 20MB.')
+                source.write(chunk)
+    except requests.exceptions.Timeout:
+        source.close()
+        raise BookmarkError('Request timed out. The image server is taking too long to respond.')
+    except requests.exceptions.RequestException as e:
+        source.close()
+        raise BookmarkError(f'Failed to download image: {e}')
+    except BaseException:
+        source.close()
+        raise
+    source.seek(0)
+    return source
+
+
+def optimize_image(source):
+    """
+    Flatten to RGB, cap the longest side at MAX_DIMENSION and re-encode as JPEG.
+
+    ``source`` is a file object; the result is a temporary file positioned at
+    the start, ready to be streamed to storage, which the caller closes.
+
+    Memory is bounded by the decoded image rather than the download. The
+    size is read from the header and anything over MAX_PIXELS, or longer
+    than MAX_SIDE on either side, is refused before decoding. JPEGs are
+    decoded with ``draft()``, which downscales in the decoder by up to 8x, so
+    a large photo never exists at full size: with the MAX_SIDE cap the decoded
+    image is at most 2 * MAX_DIMENSION on its longest side (3 bytes a pixel,
+    ~48MB worst case, usually well under 12MB). Other formats decode
+    at full size, at most MAX_PIXELS * 4 bytes (160MB) for RGBA. Everything
+    after the resize works on at most MAX_DIMENSION**2 pixels (~16MB). The
+    downloaded and encoded bytes spill to disk beyond SPOOL_MAX_MEMORY.
+
+    CPU-bound, which is why it runs on the job worker processes (``run_jobs
+    --processes``) rather than in a web worker.
+    """
+    optimized = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    try:
+        with PILImage.open(source) as img:
+            width, height = img.size
+            if width * height > MAX_PIXELS or max(width, height) > MAX_SIDE:
+                raise BookmarkError('Image dimensions are too large.')
+
+            # JPEG only: decode at the smallest 1/2, 1/4 or 1/8 scale that still
+            # covers the target size. A no-op for other formats.
+            longest = max(width, height)
+            if longest > MAX_DIMENSION:
+                img.draft('RGB', (width * MAX_DIMENSION // longest, height * MAX_DIMENSION // longest))
+            else:
+                img.draft('RGB', (width, height))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+
+            # Resize before flattening so the copies below are at most MAX_DIMENSION square
+            if max(img.size) > MAX_DIMENSION:
+                img.thumbnail((MAX_DIMENSION, MAX_DIMENSION), PILImage.Resampling.LANCZOS)
+
+            # Convert RGBA/LA to RGB (for JPEG compatibility)
+            if img.mode in ('RGBA', 'LA'):
+                # Composite onto a white background using the alpha channel
+                background = PILImage.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel('A'))
+                img = background
+            elif img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            img.save(optimized, format='JPEG', quality=85, optimize=True)
+    except PILImage.UnidentifiedImageError:
+        optimized.close()
+        raise BookmarkError('The URL does not point to a valid image file.')
+    except PILImage.DecompressionBombError:
+        optimized.close()
+        raise BookmarkError('Image dimensions are too large.')
+    except OSError as e:
+        optimized.close()
+        raise BookmarkError(f'Failed to process image: {e}')
+    except BaseException:
+        optimized.close()
+        raise
+    optimized.seek(0)
+    return optimized
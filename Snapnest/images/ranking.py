@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from Snapnest.pagination import RankedKeysetPaginator
+
+from .models import Image
+
+RANKING_KEY = 'image_ranking'
+HOURLY_KEY = 'image_ranking:hour:{hour}'
+WINDOW_KEY = 'image_ranking:{window}'
+
+# Hourly buckets are merged into these windows; 'all' reads the all-time set directly
+WINDOW_HOURS = {
+    'day': 24,
+    'week': 24 * 7,
+}
+WINDOWS = ('all',) + tuple(WINDOW_HOURS)
+
+# Keep a bucket a little longer than the widest window that reads it
+HOURLY_TTL = int(timedelta(hours=WINDOW_HOURS['week'] + 1).total_seconds())
+# How long a merged window is reused before it is rebuilt from the buckets
+WINDOW_CACHE_TTL = 60
+
+
+def hourly_key(moment):
+    return HOURLY_KEY.format(hour=moment.strftime('%Y%m%d%H'))
+
+
+def record_view(redis_conn, image_id, amount=1):
+    """Bump an image in the all-time ranking and in the current hourly bucket"""
+    bucket = hourly_key(timezone.now())
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.zincrby(RANKING_KEY, amount, image_id)
+    pipe.zincrby(bucket, amount, image_id)
+    pipe.expire(bucket, HOURLY_TTL)
+    pipe.execute()
+
+
+def window_key(redis_conn, window):
+    """
+    Return the sorted set holding scores for ``window``.
+
+    Windowed sets are the ZUNIONSTORE of their hourly buckets. The merged set is
+    kept for WINDOW_CACHE_TTL seconds so the union runs at most once a minute,
+    no matter how often the ranking is read.
+    """
+    if window not in WINDOW_HOURS:
+        return RANKING_KEY
+
+    key = WINDOW_KEY.format(window=window)
+    if redis_conn.exists(key):
+        return key
+
+    now = timezone.now()
+    buckets = [
+        hourly_key(now - timedelta(hours=hours))
+        for hours in range(WINDOW_HOURS[window])
+    ]
+    pipe = redis_conn.pipeline()
+    pipe.zunionstore(key, buckets)
+    pipe.expire(key, WINDOW_CACHE_TTL)
+    pipe.execute()
+    return key
+
+
+def top_image_ids(redis_conn, window='all', offset=0, limit=10):
+    """Return ``[(image_id, score), ...]`` for one slice of the window's ranking"""
+    key = window_key(redis_conn, window)
+    ranking = redis_conn.zrange(key, offset, offset + limit - 1, desc=True, withscores=True)
+    return [(int(member), int(score)) for member, score in ranking]
+
+
+class RankedImagePaginator(RankedKeysetPaginator):
+    """Ranked images first (by views), then the rest newest-first"""
+
+    def __init__(self, redis_conn, per_page, queryset=None, ranking_key=RANKING_KEY):
+        super().__init__(
+            redis_conn,
+            per_page,
+            queryset if queryset is not None else Image.objects.all(),
+            ranking_key,
+            keyset_field='created',
+        )
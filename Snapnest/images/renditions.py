@@ -0,0 +1,183 @@
+import base64
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.files import get_thumbnailer
+from easy_thumbnails.storage import thumbnail_default_storage
+from PIL import Image as PILImage, features
+
+# Longest side of the inline placeholder; the client blurs it up while the real image loads
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 50
+
+# Extra encodings stored next to each JPEG rendition, with their Pillow save options.
+# AVIF is skipped when Pillow was built without it.
+MODERN_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 55},
+}
+MIME_TYPES = {
+    'jpeg': 'image/jpeg',
+    'webp': 'image/webp',
+    'avif': 'image/avif',
+}
+
+
+def placeholder_data_uri(fieldfile):
+    """A tiny JPEG of the image as a data URI (a few hundred bytes) for LQIP"""
+    fieldfile.open('rb')
+    try:
+        with PILImage.open(fieldfile) as img:
+            # Let JPEG decode at 1/8 scale instead of decoding every pixel
+            img.draft('RGB', (PLACEHOLDER_SIZE * 2, PLACEHOLDER_SIZE * 2))
+            img = img.convert('RGB')
+            img.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+            content = BytesIO()
+            img.save(content, format='JPEG', quality=PLACEHOLDER_QUALITY)
+    finally:
+        fieldfile.close()
+    return 'data:image/jpeg;base64,' + base64.b64encode(content.getvalue()).decode()
+
+
+def available_formats():
+    return [name for name in MODERN_FORMATS if features.check(name)]
+
+
+def _encode_variants(fieldfile, sizes):
+    """
+    Encode the original at each ``{width: (w, h)}`` size in every modern format.
+
+    The original is decoded once; each size is resampled from it rather than
+    from the JPEG rendition, so WebP/AVIF do not inherit JPEG artifacts.
+    Returns ``{width: {format: bytes}}``.
+    """
+    formats = available_formats()
+    if not formats or not sizes:
+        return {}
+    encoded = {}
+    fieldfile.open('rb')
+    try:
+        with PILImage.open(fieldfile) as img:
+            # JPEG decodes straight at the largest rendition's scale (or up to 2x it)
+            img.draft('RGB', max(sizes.values()))
+            img = img.convert('RGB')
+            for width, size in sizes.items():
+                resized = img.resize(size, PILImage.Resampling.LANCZOS) if size != img.size else img
+                encoded[width] = {}
+                for name in formats:
+                    content = BytesIO()
+                    resized.save(content, **MODERN_FORMATS[name])
+                    encoded[width][name] = content.getvalue()
+    finally:
+        fieldfile.close()
+    return encoded
+
+
+def generate_renditions(image):
+    """
+    Render every width alias in THUMBNAIL_ALIASES['images.Image.image'] as
+    JPEG, WebP and AVIF, plus the placeholder, and record them on the image as
+    ``{width: {format: {'name': ..., 'bytes': ...}}}``.
+
+    Runs on the job worker after upload, so feed requests only read
+    ``Image.renditions`` and never touch easy-thumbnails' tables or the files.
+    """
+    if not image.image:
+        return
+    previous = rendition_names(image)
+
+    thumbnailer = get_thumbnailer(image.image)
+    renditions = {}
+    sizes = {}
+    for alias, options in aliases.all(image.image).items():
+        thumbnail = thumbnailer.get_thumbnail(dict(options, ALIAS=alias))
+        width = str(options['size'][0])
+        renditions[width] = {'jpeg': {'name': thumbnail.name, 'bytes': thumbnail.size}}
+        sizes[width] = (thumbnail.width, thumbnail.height)
+
+    for width, variants in _encode_variants(image.image, sizes).items():
+        jpeg_name = renditions[width]['jpeg']['name']
+        for name, content in variants.items():
+            stored = thumbnail_default_storage.save(f'{jpeg_name}.{name}', ContentFile(content))
+            renditions[width][name] = {'name': stored, 'bytes': len(content)}
+
+    image.renditions = renditions
+    image.placeholder = placeholder_data_uri(image.image)
+    image.save(update_fields=['renditions', 'placeholder'])
+
+    # Variants from an earlier run (JPEG names are stable, so they are kept)
+    delete_renditions(set(previous) - set(rendition_names(image)))
+
+
+def rendition_names(image):
+    return [
+        variant['name']
+        for variants in image.renditions.values()
+        for variant in variants.values()
+    ]
+
+
+def accepted_formats(accept):
+    """
+    Formats named explicitly in an Accept header. JPEG is always acceptable;
+    wildcards alone do not opt a client into WebP or AVIF.
+    """
+    formats = {'jpeg'}
+    for part in (accept or '').split(','):
+        media_type, *params = [piece.strip() for piece in part.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        for name, mime_type in MIME_TYPES.items():
+            if media_type.lower() == mime_type and quality > 0:
+                formats.add(name)
+    return formats
+
+
+def best_variant(variants, formats):
+    """The smallest stored variant in one of ``formats``"""
+    candidates = [variant for name, variant in variants.items() if name in formats]
+    return min(candidates, key=lambda variant: variant['bytes']) if candidates else None
+
+
+def _url(name, request):
+    url = thumbnail_default_storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def _widths(image):
+    return sorted(image.renditions.items(), key=lambda item: int(item[0]))
+
+
+def srcset(image, request=None):
+    """
+    ``{width: url}`` for the image's renditions, each in the smallest format
+    the request's Accept header allows. Absolute when ``request`` is given.
+    """
+    formats = accepted_formats(request.headers.get('Accept') if request else None)
+    urls = {}
+    for width, variants in _widths(image):
+        variant = best_variant(variants, formats)
+        if variant:
+            urls[width] = _url(variant['name'], request)
+    return urls
+
+
+def sources(image, request=None):
+    """``{format: {width: url}}`` for <picture> elements, which negotiate in the browser"""
+    urls = {}
+    for width, variants in _widths(image):
+        for name, variant in variants.items():
+            urls.setdefault(name, {})[width] = _url(variant['name'], request)
+    return urls
+
+
+def delete_renditions(names):
+    for name in names:
+        thumbnail_default_storage.delete(name)
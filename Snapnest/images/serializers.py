@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import Image, Comment
+from . import renditions
 
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -19,13 +20,29 @@ class CommentSerializer(serializers.ModelSerializer):
         return None
 
 
-class ImageSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Trim the output to the fields named in ``?fields=a,b,c`` when the request asks for it"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = request.query_params.get('fields') if request else None
+        if requested:
+            allowed = {name.strip() for name in requested.split(',') if name.strip()}
+            for name in set(self.fields) - allowed:
+                self.fields.pop(name)
+
+
+class ImageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.ReadOnlyField(source='user.username')
     user_photo = serializers.SerializerMethodField()
     total_likes = serializers.IntegerField(read_only=True)
     comments = CommentSerializer(many=True, read_only=True)
     is_liked = serializers.SerializerMethodField()
     total_views = serializers.SerializerMethodField()
+    unique_views = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+    sources = serializers.SerializerMethodField()
 
     class Meta:
         model = Image
@@ -43,8 +60,15 @@ class ImageSerializer(serializers.ModelSerializer):
             'total_likes',
             'comments',
             'is_liked',
-            'total_views'
+            'total_views',
+            'unique_views',
+            'status',
+            'processing_error',
+            'srcset',
+            'sources',
+            'placeholder'
         ]
+        read_only_fields = ['status', 'processing_error', 'placeholder']
         extra_kwargs = {
             'image': {'required': False},
             'url': {'required': False}
@@ -58,13 +82,21 @@ class ImageSerializer(serializers.ModelSerializer):
             pass
         return None
     
+    def get_srcset(self, obj):
+        # {width: url} in the smallest format the Accept header allows; empty until rendered
+        return renditions.srcset(obj, self.context.get('request'))
+
+    def get_sources(self, obj):
+        # {format: {width: url}} for <picture>
+        return renditions.sources(obj, self.context.get('request'))
+
     def get_is_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            # Use prefetched data if available to avoid extra query
-            if hasattr(obj, '_prefetched_objects_cache') and 'users_like' in obj._prefetched_objects_cache:
-                return request.user in obj.users_like.all()
-            return request.user in obj.users_like.all()
+            # Use the Exists() annotation from the ViewSet queryset when available
+            if hasattr(obj, 'is_liked'):
+                return obj.is_liked
+            return obj.users_like.filter(id=request.user.id).exists()
         return False
     
     def get_total_views(self, obj):
@@ -83,3 +115,33 @@ class ImageSerializer(serializers.ModelSerializer):
             return int(views)
         except:
             return obj.total_views
+
+    def get_unique_views(self, obj):
+        # Distinct viewers from the per-image HyperLogLog (approximate, ~0.8% error)
+        if hasattr(obj, '_redis_unique_views'):
+            return obj._redis_unique_views
+
+        try:
+            from .api_views import r
+            from .counters import viewers_key
+            return r.pfcount(viewers_key(obj.id))
+        except:
+            return None
+
+
+class ImageListSerializer(ImageSerializer):
+    """
+    Compact feed representation: a comment count and the first few comments
+    instead of every comment on every image.
+
+    Expects the queryset to annotate ``comments_count`` and prefetch
+    ``comment_previews`` (see ImageViewSet.get_queryset).
+    """
+    comments = None
+    comments_count = serializers.IntegerField(read_only=True)
+    comment_previews = CommentSerializer(many=True, read_only=True)
+
+    class Meta(ImageSerializer.Meta):
+        fields = [
+            name for name in ImageSerializer.Meta.fields if name != 'comments'
+        ] + ['comments_count', 'comment_previews']
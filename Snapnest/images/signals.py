@@ -1,8 +1,30 @@
-from django.db.models.signals import m2m_changed
+from django.db.models.signals import m2m_changed, post_delete
 from django.dispatch import receiver
+from Snapnest.jobs import enqueue
+from .jobs import reconcile_total_likes
+from .renditions import delete_renditions, rendition_names
 from .models import Image
 
 @receiver(m2m_changed,sender=Image.users_like.through)
-def users_like_changed(sender,instance,**kwargs):
-    instance.total_likes=instance.users_like.count()
-    instance.save()
+def users_like_changed(sender,instance,action,reverse,pk_set,**kwargs):
+    # Recount on the job worker instead of saving the image inside the request
+    if reverse and action == 'pre_clear':
+        # post_clear gets no pk_set, so remember which images the user liked
+        instance._cleared_like_image_ids = list(
+            sender.objects.filter(user_id=instance.id).values_list('image_id', flat=True)
+        )
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse and action == 'post_clear':
+        image_ids = instance.__dict__.pop('_cleared_like_image_ids', ())
+    else:
+        image_ids = (pk_set or ()) if reverse else [instance.id]
+    for image_id in image_ids:
+        enqueue(reconcile_total_likes, image_id)
+
+
+@receiver(post_delete,sender=Image)
+def image_deleted(sender,instance,**kwargs):
+    if instance.renditions:
+        enqueue(delete_renditions, rendition_names(instance))
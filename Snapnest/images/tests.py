@@ -1,10 +1,28 @@
-from django.test import TestCase
+from django.test import Client, TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.urls import reverse
-from rest_framework.test import APIClient
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
-from images.models import Image
+from images.models import Image, Comment
+from images.ranking import RankedImagePaginator, record_view, hourly_key
+from django.utils import timezone
+from images.api_views import r
+from images.counters import flush_views, increment_views, viewer_fingerprint, DIRTY_KEY, FLUSHING_KEY
+from images import likes
+import os
+import shutil
+import tempfile
 import uuid
+from io import BytesIO
+from unittest import mock
+from PIL import Image as PILImage
+from Snapnest import jobs
+from actions.models import Action
+from images import processing
+from images.processing import BookmarkError
 
 User = get_user_model()
 
@@ -26,6 +44,29 @@ class ImageTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['uuid'], str(self.image.uuid))
 
+    def test_like_engine_is_idempotent(self):
+        self.assertEqual(likes.like(self.image, self.user), (True, 1))
+        self.assertEqual(likes.like(self.image, self.user), (False, 1))
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.total_likes, 1)
+        self.assertEqual(likes.unlike(self.image, self.user), (True, 0))
+        self.assertEqual(likes.unlike(self.image, self.user), (False, 0))
+        self.assertFalse(self.image.users_like.exists())
+
+    def test_is_liked_follows_like_toggle(self):
+        other = User.objects.create_user(username='fan', email='fan@example.com', password='password123')
+        likes.like(self.image, other)
+        self.assertFalse(self.client.get(self.url).data['is_liked'])
+
+        response = self.client.post(f'{self.url}like/')
+        self.assertEqual(response.data['total_likes'], 2)
+        self.assertTrue(self.client.get(self.url).data['is_liked'])
+        self.assertTrue(self.client.get('/api/images/').data['results'][0]['is_liked'])
+
+        response = self.client.post(f'{self.url}like/')
+        self.assertFalse(response.data['liked'])
+        self.assertFalse(self.client.get(self.url).data['is_liked'])
+
     def test_increment_views(self):
         """Test view increment logic"""
         increment_url = f'{self.url}increment_views/'
@@ -40,6 +81,173 @@ class ImageTests(TestCase):
         # Note: Depending on how Redis sync works in test env, this might require mocking Redis
         # But for now we assume the view logic writes to DB or at least returns incremented value
 
+    def test_increment_views_seeds_and_ranks(self):
+        """A missing counter is seeded from the DB and the rankings are bumped in the same call"""
+        r.delete(f'image:{self.image.id}:views', f'image:{self.image.id}:viewers')
+        bucket = hourly_key(timezone.now())
+        ranked = r.zscore('image_ranking', self.image.id) or 0
+        hourly = r.zscore(bucket, self.image.id) or 0
+
+        self.assertEqual(increment_views(r, self.image), (11, 0))
+        self.assertEqual(r.zscore('image_ranking', self.image.id), ranked + 1)
+        self.assertEqual(r.zscore(bucket, self.image.id), hourly + 1)
+        self.assertIsNotNone(r.zscore(DIRTY_KEY, self.image.id))
+
+    @override_settings(IMAGE_VIEWS_UNIQUE_RANKING=True)
+    def test_unique_viewers_drive_ranking(self):
+        """Repeat views count as raw views but only move the ranking once per viewer"""
+        r.delete(f'image:{self.image.id}:views', f'image:{self.image.id}:viewers')
+        ranked = r.zscore('image_ranking', self.image.id) or 0
+
+        increment_url = f'{self.url}increment_views/'
+        self.client.post(increment_url)
+        response = self.client.post(increment_url)
+        self.assertEqual(response.data, {'total_views': 12, 'unique_views': 1})
+        self.assertEqual(r.zscore('image_ranking', self.image.id), ranked + 1)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['total_views'], 12)
+        self.assertEqual(response.data['unique_views'], 1)
+
+    def test_flush_views_writes_counters_to_db(self):
+        """Buffered views reach the DB in one flush and replays do not double count"""
+        r.delete(f'image:{self.image.id}:views')
+        increment_url = f'{self.url}increment_views/'
+        for _ in range(3):
+            self.client.post(increment_url)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.total_views, 10)
+
+        flush_views(r)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.total_views, 13)
+
+        # A flusher that died before clearing its batch leaves it behind to be replayed
+        r.zadd(FLUSHING_KEY, {self.image.id: 0})
+        flush_views(r)
+        self.image.refresh_from_db()
+        self.assertEqual(self.image.total_views, 13)
+        self.assertFalse(r.exists(FLUSHING_KEY))
+
+    def test_anonymous_viewers_cannot_spoof_their_address(self):
+        """Only the hop appended by our proxy identifies an anonymous viewer"""
+        def fingerprint(forwarded):
+            request = APIRequestFactory().get(self.url, HTTP_X_FORWARDED_FOR=forwarded, REMOTE_ADDR='10.0.0.1')
+            request.user = AnonymousUser()
+            return viewer_fingerprint(request)
+
+        self.assertEqual(fingerprint('1.1.1.1, 203.0.113.7'), fingerprint('2.2.2.2, 203.0.113.7'))
+        self.assertNotEqual(fingerprint('203.0.113.7'), fingerprint('203.0.113.8'))
+        with self.settings(TRUSTED_PROXY_COUNT=0):
+            self.assertEqual(fingerprint('1.1.1.1'), fingerprint('2.2.2.2'))
+
+
+class ImageListSerializerTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='lister', email='lister@example.com', password='password123')
+        self.client.force_authenticate(user=self.user)
+        self.image = Image.objects.create(user=self.user, title='Busy')
+        for i in range(5):
+            Comment.objects.create(image=self.image, user=self.user, body=f'Comment {i}')
+
+    def test_list_returns_count_and_previews(self):
+        response = self.client.get('/api/images/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        item = response.data['results'][0]
+        self.assertNotIn('comments', item)
+        self.assertEqual(item['comments_count'], 5)
+        self.assertEqual([c['body'] for c in item['comment_previews']], ['Comment 0', 'Comment 1', 'Comment 2'])
+
+    def test_list_is_cursor_paginated(self):
+        for i in range(25):
+            Image.objects.create(user=self.user, title=f'Extra {i}')
+        response = self.client.get('/api/images/')
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertNotIn('count', response.data)
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertIsNone(response.data['next'])
+
+    def test_expand_comments_and_sparse_fields(self):
+        response = self.client.get('/api/images/', {'expand': 'comments'})
+        self.assertEqual(len(response.data['results'][0]['comments']), 5)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/images/', {'fields': 'uuid,title'})
+        self.assertEqual(set(response.data['results'][0]), {'uuid', 'title'})
+        # Comment previews, counts and likes are not queried for fields nobody asked for
+        self.assertNotIn('images_comment', ' '.join(query['sql'] for query in queries))
+        self.assertNotIn('images_image_users_like', ' '.join(query['sql'] for query in queries))
+
+
+class RankingWindowTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='password123')
+        self.client.force_authenticate(user=self.user)
+        self.popular = Image.objects.create(user=self.user, title='Popular')
+        self.quiet = Image.objects.create(user=self.user, title='Quiet')
+        r.delete('image_ranking:day')
+        record_view(r, self.popular.id, 10**9)
+        record_view(r, self.quiet.id, 10**9 - 1)
+
+    def tearDown(self):
+        for key in ('image_ranking', hourly_key(timezone.now())):
+            r.zrem(key, self.popular.id, self.quiet.id)
+        r.delete('image_ranking:day')
+
+    def test_ranking_is_limited_and_windowed(self):
+        response = self.client.get('/api/images/ranking/', {'window': 'day', 'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data], [self.popular.id])
+
+        response = self.client.get('/api/images/ranking/', {'window': 'day', 'limit': 1, 'offset': 1})
+        self.assertEqual([item['id'] for item in response.data], [self.quiet.id])
+
+    def test_ranking_rejects_unknown_window(self):
+        response = self.client.get('/api/images/ranking/', {'window': 'year'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RankedImagePaginatorTests(TestCase):
+    ranking_key = 'test:image_ranking'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ranker', email='ranker@example.com', password='password123')
+        self.images = [
+            Image.objects.create(user=self.user, title=f'Image {i}') for i in range(5)
+        ]
+        r.delete(self.ranking_key)
+        r.zadd(self.ranking_key, {self.images[0].id: 5, self.images[3].id: 9})
+
+    def tearDown(self):
+        r.delete(self.ranking_key)
+
+    def test_ranked_first_then_newest(self):
+        """Ranked images come first by score, the rest follow newest-first across pages"""
+        paginator = RankedImagePaginator(r, 2, ranking_key=self.ranking_key)
+        seen = []
+        cursor = None
+        while True:
+            page = paginator.page(cursor)
+            seen.extend(image.id for image in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+
+        expected = [self.images[3].id, self.images[0].id] + [
+            self.images[i].id for i in (4, 2, 1)
+        ]
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_restarts(self):
+        paginator = RankedImagePaginator(r, 2, ranking_key=self.ranking_key)
+        page = paginator.page('not-a-cursor')
+        self.assertEqual([image.id for image in page], [self.images[3].id, self.images[0].id])
+
+
 class AccountTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -58,3 +266,131 @@ class AccountTests(TestCase):
         self.assertIn('email', response.data)
         # DRF returns list of errors
         self.assertIn('A user with this email already exists.', str(response.data['email']))
+
+
+class BookmarkProcessingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        r.delete(jobs.QUEUE_KEY, jobs.PROCESSING_KEY, jobs.DELAYED_KEY)
+        # Ids are reused between runs, so an earlier run's dedupe key would suppress the action
+        for key in r.scan_iter('action_dedupe:*'):
+            r.delete(key)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='bookmarker', password='password123')
+        self.other = User.objects.create_user(username='other', password='password123')
+        self.client.force_authenticate(user=self.user)
+
+    def png(self, size=(3000, 1500)):
+        content = BytesIO()
+        PILImage.new('RGBA', size, (255, 0, 0, 128)).save(content, format='PNG')
+        return content.getvalue()
+
+    def bookmark(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/images/', {
+                'title': 'Remote', 'url': 'https://example.com/remote.png'
+            })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'processing')
+        self.assertIsNone(response.data['image'])
+        return Image.objects.get(uuid=response.data['uuid'])
+
+    def test_bookmark_is_processed_on_worker(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            image = self.bookmark()
+            # Hidden from everyone but the owner until it is ready
+            self.client.force_authenticate(user=self.other)
+            self.assertEqual(self.client.get(f'/api/images/{image.uuid}/').status_code, 404)
+
+            with mock.patch('images.jobs.fetch_image', return_value=BytesIO(self.png())) as fetch, \
+                    self.captureOnCommitCallbacks(execute=True):
+                jobs.work(r, burst=True)
+            fetch.assert_called_once_with('https://example.com/remote.png')
+            jobs.work(r, burst=True)  # the action queued by the bookmark job
+
+            image.refresh_from_db()
+            self.assertEqual(image.status, Image.Status.READY)
+            with PILImage.open(image.image.path) as stored:
+                self.assertEqual((stored.format, stored.size), ('JPEG', (2048, 1024)))
+            self.assertTrue(Action.objects.filter(user=self.user, verb='uploaded image').exists())
+            response = self.client.get(f'/api/images/{image.uuid}/')
+            self.assertEqual(response.status_code, 200)
+
+            # Responsive renditions and the LQIP placeholder are ready with it
+            self.assertEqual(list(response.data['srcset']), ['240', '480', '1080'])
+            self.assertTrue(response.data['placeholder'].startswith('data:image/jpeg;base64,'))
+            self.assertLess(len(response.data['placeholder']), 1000)
+            for name, variant in image.renditions['480'].items():
+                with PILImage.open(os.path.join(self.media_root, variant['name'])) as rendition:
+                    self.assertEqual((rendition.format, rendition.size), (name.upper(), (480, 240)))
+
+            # srcset negotiates on Accept; <picture> gets every format
+            self.assertTrue(response.data['srcset']['240'].endswith('.jpg'))
+            self.assertEqual(sorted(response.data['sources']), ['avif', 'jpeg', 'webp'])
+            response = self.client.get(
+                f'/api/images/{image.uuid}/', HTTP_ACCEPT='application/json, image/webp'
+            )
+            self.assertTrue(response.data['srcset']['240'].endswith('.webp'))
+            self.assertIn('Accept', response['Vary'])
+
+            self.client.logout()
+            response = self.client.get(
+                reverse('images:rendition', args=[image.uuid, 480]),
+                HTTP_ACCEPT='image/avif,image/webp,image/*,*/*;q=0.8',
+            )
+            smallest = min(image.renditions['480'].values(), key=lambda variant: variant['bytes'])
+            self.assertRedirects(response, f"/media/{smallest['name']}", fetch_redirect_response=False)
+            self.assertIn('Accept', response['Vary'])
+
+    def test_failed_bookmark_keeps_the_reason(self):
+        image = self.bookmark()
+        error = BookmarkError('Image is too large. Maximum size is 20MB.')
+        with mock.patch('images.jobs.fetch_image', side_effect=error):
+            jobs.work(r, burst=True)
+        image.refresh_from_db()
+        self.assertEqual(image.status, Image.Status.FAILED)
+        self.assertEqual(image.processing_error, str(error))
+
+    def test_unfinished_bookmarks_are_hidden_from_template_lists(self):
+        image = self.bookmark()
+        increment_views(r, image)
+        browser = Client()
+        browser.force_login(self.other)
+
+        response = browser.get(reverse('images:list'), {'images_only': 1})
+        self.assertEqual(response.content, b'')
+        response = browser.get(reverse('images:ranking'))
+        self.assertNotIn(image, response.context['most_viewed'])
+
+    def test_large_jpeg_is_downscaled_on_decode(self):
+        content = BytesIO()
+        PILImage.new('RGB', (6000, 3000), (0, 128, 255)).save(content, format='JPEG')
+        content.seek(0)
+        decoded = []
+        thumbnail = PILImage.Image.thumbnail
+
+        def spy(img, *args, **kwargs):
+            decoded.append(img.size)
+            return thumbnail(img, *args, **kwargs)
+
+        with mock.patch.object(PILImage.Image, 'thumbnail', spy):
+            with processing.optimize_image(content) as optimized:
+                with PILImage.open(optimized) as stored:
+                    self.assertEqual((stored.format, stored.size), ('JPEG', (2048, 1024)))
+        # draft() decoded at half scale, so the resize started from 3000x1500
+        self.assertEqual(decoded, [(3000, 1500)])
+
+    def test_oversized_dimensions_are_refused_before_decode(self):
+        with mock.patch.object(processing, 'MAX_PIXELS', 1000 * 1000):
+            with self.assertRaisesMessage(BookmarkError, 'too large'):
+                processing.optimize_image(BytesIO(self.png()))
+        # A long panorama within MAX_PIXELS would still decode too wide
+        with mock.patch.object(processing, 'MAX_SIDE', 2000):
+            with self.assertRaisesMessage(BookmarkError, 'too large'):
+                processing.optimize_image(BytesIO(self.png()))
+
+    def test_private_urls_are_rejected_up_front(self):
+        response = self.client.post('/api/images/', {'title': 'Internal', 'url': 'http://127.0.0.1/x.png'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Image.objects.exists())
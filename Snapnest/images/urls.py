@@ -17,5 +17,6 @@ urlpatterns=[
     path('like/',views.image_like,name='like'),
     path('',views.image_list,name='list'),
     path('ranking/',views.image_ranking,name='ranking'),
+    path('rendition/<uuid:uuid>/<int:width>/',views.image_rendition,name='rendition'),
     path('', include(router.urls)),
 ]
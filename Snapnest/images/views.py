@@ -1,9 +1,10 @@
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, HttpResponseRedirect, JsonResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.shortcuts import get_object_or_404, redirect, render
 from django.views.decorators.http import require_POST
+from django.db.models import Q
 
 from .forms import ImageCreateForm, ImageUploadForm, CommentForm, ImageEditForm
 
@@ -40,7 +41,13 @@ def image_delete(request, id, slug):
         return redirect('images:list')
     return render(request, 'images/image/delete.html', {'image': image})
 from .models import Image, Comment
-from actions.utils import create_action
+from .ranking import RankedImagePaginator, top_image_ids
+from .counters import increment_views, viewer_fingerprint
+from . import likes
+from actions.jobs import queue_action
+from Snapnest.jobs import enqueue
+from .jobs import generate_image_renditions, process_bookmark
+from .renditions import accepted_formats, best_variant, thumbnail_default_storage
 import redis
 from django.conf import settings
 
@@ -61,9 +68,11 @@ def image_create(request):
             new_image = form.save(commit=False)
             # assign current user to the item
             new_image.user = request.user
+            # Downloaded and optimized on the job worker
+            new_image.status = Image.Status.PROCESSING
             new_image.save()
-            create_action(request.user,'bookmarked image',new_image)
-            messages.success(request, 'Image added successfully')
+            enqueue(process_bookmark, new_image.id, 'bookmarked image')
+            messages.success(request, 'Image added; it will appear once it has been processed')
             # redirect to new created image detail view
             return redirect(new_image.get_absolute_url())
     else:
@@ -84,7 +93,8 @@ def image_upload(request):
             new_image = form.save(commit=False)
             new_image.user = request.user
             new_image.save()
-            create_action(request.user, 'uploaded image', new_image)
+            enqueue(generate_image_renditions, new_image.id)
+            queue_action(request.user, 'uploaded image', new_image)
             messages.success(request, 'Image uploaded successfully')
             return redirect(new_image.get_absolute_url())
     else:
@@ -98,8 +108,7 @@ def image_upload(request):
 
 def image_detail(request, id, slug):
     image = get_object_or_404(Image, id=id, slug=slug)
-    total_views=r.incr(f'image:{image.id}:views')
-    r.zincrby('image_ranking',1,image.id)
+    total_views, unique_views=increment_views(r, image, viewer_fingerprint(request))
     
     # List of comments
     comments = image.comments.all()
@@ -141,10 +150,11 @@ def image_like(request):
         try:
             image = Image.objects.get(id=image_id)
             if action == 'like':
-                image.users_like.add(request.user)
-                create_action(request.user,'likes',image)
+                created, _ = likes.like(image, request.user)
+                if created:
+                    queue_action(request.user,'likes',image)
             else:
-                image.users_like.remove(request.user)
+                likes.unlike(image, request.user)
             return JsonResponse({'status': 'ok'})
         except Image.DoesNotExist:
             pass
@@ -153,37 +163,22 @@ def image_like(request):
 
 @login_required
 def image_list(request):
-    # Get ranked images from Redis
-    image_ranking = r.zrange('image_ranking', 0, -1, desc=True)
-    ranked_ids = [int(id) for id in image_ranking]
-    
-    # Get ranked images in order
-    ranked_images = Image.objects.filter(id__in=ranked_ids)
-    ranked_images = sorted(ranked_images, key=lambda x: ranked_ids.index(x.id))
-    
-    # Get unranked images
-    unranked_images = Image.objects.exclude(id__in=ranked_ids)
-    
-    # Combine: ranked first, then unranked
-    images = list(ranked_images) + list(unranked_images)
-    
-    paginator = Paginator(images, 8)
-    page = request.GET.get('page')
+    # Ranked images first (straight from the Redis slice), then the rest by date
+    # Bookmarks still processing (or failed) are only visible to their owner
+    visible = Image.objects.filter(Q(status=Image.Status.READY) | Q(user=request.user))
+    paginator = RankedImagePaginator(r, 8, visible.select_related('user'))
+    images = paginator.page(request.GET.get('cursor'))
     images_only = request.GET.get('images_only')
-    try:
-        images = paginator.page(page)
-    except PageNotAnInteger:
-        images = paginator.page(1)
-    except EmptyPage:
-        if images_only:
-            return HttpResponse('')
-        images = paginator.page(paginator.num_pages)
     if images_only:
-        return render(
+        if not images:
+            return HttpResponse('')
+        response = render(
             request,
             'images/image/list_images.html',
             {'section': 'images', 'images': images},
         )
+        response['X-Next-Cursor'] = images.next_cursor or ''
+        return response
     return render(
         request,
         'images/image/list.html',
@@ -191,7 +186,6 @@ def image_list(request):
     )
 
 
-
 r=redis.Redis(
     host=settings.REDIS_HOST,
     port=settings.REDIS_PORT,
@@ -200,14 +194,13 @@ r=redis.Redis(
 
 @login_required
 def image_ranking(request):
-    image_ranking=r.zrange(
-        'image_ranking',0,-1,
-        desc=True
-    )[:10]
-    image_ranking_ids=[int(id) for id in image_ranking]
+    image_ranking_ids=[
+        image_id for image_id, score in top_image_ids(r, 'all', 0, 10)
+    ]
 
     most_viewd=list(
         Image.objects.filter(
+            Q(status=Image.Status.READY) | Q(user=request.user),
             id__in=image_ranking_ids
         )
     )
@@ -216,4 +209,22 @@ def image_ranking(request):
         request,
         'images/image/ranking.html',
         {'section':'images','most_viewed':most_viewd}
-    )
\ No newline at end of file
+    )
+
+def image_rendition(request, uuid, width):
+    """
+    Redirect to one rendition of an image in the smallest format the browser's
+    Accept header allows (AVIF, WebP or JPEG), for plain <img src> use.
+    """
+    image = get_object_or_404(
+        Image.objects.filter(status=Image.Status.READY).only('renditions'), uuid=uuid
+    )
+    variant = best_variant(
+        image.renditions.get(str(width), {}), accepted_formats(request.headers.get('Accept'))
+    )
+    if variant is None:
+        raise Http404('No such rendition')
+    response = HttpResponseRedirect(thumbnail_default_storage.url(variant['name']))
+    patch_vary_headers(response, ['Accept'])
+    patch_cache_control(response, public=True, max_age=60 * 60 * 24)
+    return response